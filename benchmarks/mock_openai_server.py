@@ -0,0 +1,224 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+
+# Local stand-in for an OpenAI compatible inference server, used to benchmark the
+# modules without a live endpoint.  Only the standard library is required.
+#
+#   python benchmarks/mock_openai_server.py --port 8089 --latency 0.05 --tokens-per-second 200
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WORDS = ["the", "pod", "restarted", "after", "memory", "pressure", "on", "node", "ocpworker1", "and", "recovered"]
+
+class MockState:
+    def __init__(self, config):
+        self.config = config
+        self.requests = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+def sample_value(schema):
+    """ Placeholder argument matching a JSON schema type """
+    schema_type = schema.get("type")
+    if "enum" in schema:
+        return random.choice(schema["enum"])
+    if schema_type == "integer":
+        return random.randint(0, 100)
+    if schema_type == "number":
+        return round(random.uniform(-90, 90), 4)
+    if schema_type == "boolean":
+        return True
+    if schema_type == "array":
+        return [sample_value(schema.get("items", {"type": "string"}))]
+    if schema_type == "object":
+        return {name: sample_value(prop) for name, prop in schema.get("properties", {}).items()}
+    return "ocpworker1"
+
+def count_prompt_tokens(messages):
+    return sum(len(str(message.get("content") or "").split()) for message in messages)
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        state = self.server.state
+        if self.path.rstrip("/").endswith("/stats"):
+            self.send_json(200, dict(requests=state.requests, failures=state.failures))
+        else:
+            self.send_json(404, dict(error=dict(message="not found")))
+
+    def do_POST(self):
+        state = self.server.state
+        config = state.config
+        raw_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.loads(raw_body or b"{}")
+
+        with state.lock:
+            state.requests += 1
+            if config.request_log != None:
+                # request bodies exactly as received, one per line, to compare what clients send
+                with open(config.request_log, "ab") as f:
+                    f.write(raw_body.replace(b"\n", b"") + b"\n")
+
+        if config.failure_rate > 0 and random.random() < config.failure_rate:
+            with state.lock:
+                state.failures += 1
+            self.send_json(config.failure_status, dict(error=dict(message="injected failure", type="server_error")),
+                           headers={"Retry-After": str(config.retry_after)})
+            return
+
+        if body.get("response_format") and config.reject_response_format:
+            self.send_json(400, dict(error=dict(message="response_format is not supported", type="invalid_request_error", param="response_format")))
+            return
+
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self.chat_completion(config, body)
+        elif self.path.rstrip("/").endswith("/embeddings"):
+            self.embeddings(config, body)
+        else:
+            self.send_json(404, dict(error=dict(message=f"unsupported path {self.path}")))
+
+    def embeddings(self, config, body):
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+
+        data = []
+        for index, text in enumerate(inputs):
+            # deterministic bag of words vector so that similar inputs embed close together
+            vector = [0.0] * config.embedding_dimensions
+            for word in str(text).lower().split():
+                vector[zlib.crc32(word.encode("utf-8")) % config.embedding_dimensions] += 1.0
+            norm = sum(value * value for value in vector) ** 0.5 or 1.0
+            data.append(dict(object="embedding", index=index, embedding=[value / norm for value in vector]))
+
+        prompt_tokens = sum(len(str(text).split()) for text in inputs)
+        self.send_json(200, dict(object="list", data=data, model=body.get("model"),
+                                 usage=dict(prompt_tokens=prompt_tokens, total_tokens=prompt_tokens)))
+
+    def chat_completion(self, config, body):
+        time.sleep(max(0, random.gauss(config.latency, config.latency_jitter)))
+
+        messages = body.get("messages", [])
+        tools = body.get("tools") or []
+        completion_tokens = min(config.completion_tokens, body.get("max_tokens") or config.completion_tokens)
+        prompt_tokens = count_prompt_tokens(messages)
+
+        # request tools until the conversation holds the configured number of tool rounds
+        tool_rounds = sum(1 for message in messages if message.get("role") == "assistant" and message.get("tool_calls"))
+        message = dict(role="assistant", content=None)
+        finish_reason = "stop"
+        if len(tools) > 0 and config.tool_calls > 0 and tool_rounds < config.tool_rounds:
+            message["tool_calls"] = []
+            for i in range(config.tool_calls):
+                function = tools[i % len(tools)]["function"]
+                message["tool_calls"].append(dict(
+                    id=f"call_{uuid.uuid4().hex[:12]}",
+                    type="function",
+                    function=dict(name=function["name"], arguments=json.dumps(sample_value(function.get("parameters", {}))))
+                ))
+            finish_reason = "tool_calls"
+            completion_tokens = 10 * config.tool_calls
+        elif (body.get("response_format") or {}).get("type") == "json_schema":
+            message["content"] = json.dumps(sample_value(body["response_format"]["json_schema"].get("schema", {})))
+        elif (body.get("response_format") or {}).get("type") == "json_object":
+            message["content"] = json.dumps(dict(summary=" ".join(WORDS[i % len(WORDS)] for i in range(completion_tokens))))
+        else:
+            message["content"] = " ".join(WORDS[i % len(WORDS)] for i in range(completion_tokens))
+
+        usage = dict(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        token_interval = 0 if config.tokens_per_second <= 0 else 1.0 / config.tokens_per_second
+
+        if not body.get("stream"):
+            time.sleep(token_interval * completion_tokens)
+            self.send_json(200, dict(id=completion_id, object="chat.completion", created=created, model=body.get("model"),
+                                     choices=[dict(index=0, message=message, finish_reason=finish_reason)], usage=usage))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_chunk(delta, finish=None, chunk_usage=None, choices=True):
+            chunk = dict(id=completion_id, object="chat.completion.chunk", created=created, model=body.get("model"),
+                         choices=[dict(index=0, delta=delta, finish_reason=finish)] if choices else [])
+            if chunk_usage is not None:
+                chunk["usage"] = chunk_usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send_chunk(dict(role="assistant", content=""))
+        if "tool_calls" in message:
+            for index, tool_call in enumerate(message["tool_calls"]):
+                send_chunk(dict(tool_calls=[dict(index=index, id=tool_call["id"], type="function",
+                                                 function=dict(name=tool_call["function"]["name"], arguments=""))]))
+                send_chunk(dict(tool_calls=[dict(index=index, function=dict(arguments=tool_call["function"]["arguments"]))]))
+        else:
+            for word in message["content"].split(" "):
+                time.sleep(token_interval)
+                send_chunk(dict(content=word + " "))
+        send_chunk({}, finish=finish_reason)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            send_chunk({}, chunk_usage=usage, choices=False)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Mock OpenAI compatible server for benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="standard deviation of the latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="generation rate, 0 for instant")
+    parser.add_argument("--completion-tokens", type=int, default=50, help="tokens generated per response")
+    parser.add_argument("--tool-calls", type=int, default=0, help="tool calls requested per round when tools are offered")
+    parser.add_argument("--tool-rounds", type=int, default=1, help="rounds of tool calls before answering")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with an error")
+    parser.add_argument("--failure-status", type=int, default=500, help="HTTP status used for injected failures")
+    parser.add_argument("--embedding-dimensions", type=int, default=64, help="length of vectors returned by /embeddings")
+    parser.add_argument("--reject-response-format", action="store_true", help="answer requests with a response_format with 400")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After header sent with injected failures")
+    parser.add_argument("--request-log", default=None, help="file to append the raw body of every request to, one per line")
+    return parser
+
+def create_server(config):
+    server = ThreadingHTTPServer((config.host, config.port), MockHandler)
+    server.daemon_threads = True
+    server.state = MockState(config)
+    return server
+
+def main():
+    config = build_parser().parse_args()
+    server = create_server(config)
+    print(f"Mock OpenAI server listening on http://{config.host}:{server.server_address[1]}/v1", flush=True)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+
+# Offline benchmark harness for the openai-chat and openai-summarize modules.
+#
+# Each scenario starts the mock OpenAI server with its own settings and runs the
+# module through the ansible CLI exactly as the Makefile smoke tests do, so the
+# numbers include interpreter startup, imports and AnsiballZ packaging.
+#
+#   python benchmarks/run_benchmarks.py --iterations 20 --concurrency 4 --json bench.json
+
+import argparse
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import mock_openai_server
+
+SYSTEM_CONTENT = 'You are a friendly chatbot who always answers politely and with brief responses.'
+
+SCENARIOS = [
+    dict(
+        name='chat_basic',
+        mirrors='tests/test_chat_good_with_system_content.yml',
+        module='openai-chat',
+        args=dict(user_content='Hello AI Platform!  How are you today?', system_content=SYSTEM_CONTENT)
+    ),
+    dict(
+        name='chat_check_mode',
+        mirrors='tests/test_chat_good_with_system_content.yml',
+        module='openai-chat',
+        check_mode=True,
+        args=dict(user_content='Hello AI Platform!  How are you today?', system_content=SYSTEM_CONTENT)
+    ),
+    dict(
+        name='chat_stream',
+        mirrors='tests/test_chat_streaming_metrics.yml',
+        module='openai-chat',
+        args=dict(user_content='Hello AI Platform!  How are you today?', system_content=SYSTEM_CONTENT, stream=True)
+    ),
+    dict(
+        name='chat_proxy',
+        mirrors='tests/test_chat_proxy_daemon.yml',
+        module='openai-chat',
+        args=dict(user_content='Hello AI Platform!  How are you today?', system_content=SYSTEM_CONTENT,
+                  proxy_socket=os.path.join(tempfile.gettempdir(), 'openai-bench-proxy.sock'), proxy_idle_timeout=30)
+    ),
+    dict(
+        name='chat_batch',
+        mirrors='tests/test_chat_batch_prompts.yml',
+        module='openai-chat',
+        args=dict(prompts=[f'What is the capital of state number {i}?' for i in range(8)], system_content=SYSTEM_CONTENT, batch_concurrency=4)
+    ),
+    dict(
+        name='tool_basic',
+        mirrors='tests/test_tool_basic.yml',
+        module='openai-chat',
+        server=dict(tool_calls=1),
+        args=dict(user_content='What is the weather like in Atlanta today?', system_content=SYSTEM_CONTENT, tool_modules='tool-mock-weather.py')
+    ),
+    dict(
+        name='tool_multiple_same',
+        mirrors='tests/test_tool_multiple_same.yml',
+        module='openai-chat',
+        server=dict(tool_calls=2),
+        args=dict(user_content='What is the temperature today in Boston and Atlanta?', system_content=SYSTEM_CONTENT, tool_modules='tool-mock-weather.py')
+    ),
+    dict(
+        name='chat_failure_injection',
+        mirrors='tests/test_chat_good_with_system_content.yml',
+        module='openai-chat',
+        server=dict(failure_rate=0.2, failure_status=503),
+        args=dict(user_content='Hello AI Platform!  How are you today?', system_content=SYSTEM_CONTENT)
+    ),
+    dict(
+        name='summarize_check_mode',
+        mirrors='tests/test_summarize_log_fragment.yml',
+        module='openai-summarize',
+        check_mode=True,
+        args=dict(dir_path=os.path.join(REPO_DIR, 'tests'), file_regex='openshift_pod_log_fragment.txt')
+    ),
+    dict(
+        name='summarize_log_fragment',
+        mirrors='tests/test_summarize_log_fragment.yml',
+        module='openai-summarize',
+        args=dict(dir_path=os.path.join(REPO_DIR, 'tests'), file_regex='openshift_pod_log_fragment.txt', strategy='map_reduce', chunk_size=500)
+    ),
+]
+
+# heavy imports pulled in by the modules, measured individually with -X importtime
+IMPORTS = ['httpx', 'openai', 'langchain_openai', 'langchain.chains.summarize', 'langchain_community.document_loaders']
+
+def percentile(values, pct):
+    """ Nearest-rank percentile """
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(pct / 100.0 * len(ordered))))
+    return round(ordered[rank - 1], 4)
+
+def maxrss_mb(rusage):
+    if sys.platform == "darwin":
+        return round(rusage.ru_maxrss / (1024 * 1024), 2)
+    return round(rusage.ru_maxrss / 1024, 2)
+
+def start_mock_server(overrides):
+    config = mock_openai_server.build_parser().parse_args(['--port', '0'])
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    server = mock_openai_server.create_server(config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run_module_once(scenario, endpoint_url, model_name, env):
+    module_args = dict(endpoint_url=endpoint_url, model_name=model_name, api_key='no-token-needed')
+    module_args.update(scenario['args'])
+    command = ['ansible', 'localhost', '-m', scenario['module'], '-a', json.dumps(module_args)]
+    if scenario.get('check_mode'):
+        command.append('--check')
+
+    start_time = time.monotonic()
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout = process.stdout.read()
+    process.stderr.read()
+    pid, status, rusage = os.wait4(process.pid, 0)
+    wall = time.monotonic() - start_time
+
+    result = {}
+    match = re.search(rb'=> (\{.*\})', stdout, re.DOTALL)
+    if match:
+        try:
+            result = json.loads(match.group(1))
+        except ValueError:
+            result = {}
+
+    return dict(
+        wall=wall,
+        ok=os.waitstatus_to_exitcode(status) == 0 and not result.get('failed', False),
+        # the check mode fast path returns before any openai_metrics are collected
+        module_elapsed=result.get('openai_metrics', {}).get('elapsed'),
+        maxrss_mb=maxrss_mb(rusage)
+    )
+
+def run_scenario(scenario, iterations, concurrency, model_name, env):
+    server = start_mock_server(scenario.get('server', {}))
+    endpoint_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    try:
+        # warm up the page cache and the tool manifest before measuring
+        run_module_once(scenario, endpoint_url, model_name, env)
+
+        start_time = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            runs = list(executor.map(lambda i: run_module_once(scenario, endpoint_url, model_name, env), range(iterations)))
+        total_wall = time.monotonic() - start_time
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    walls = [run['wall'] for run in runs]
+    module_elapsed = [run['module_elapsed'] for run in runs if run['module_elapsed'] is not None]
+    return dict(
+        scenario=scenario['name'],
+        mirrors=scenario['mirrors'],
+        iterations=iterations,
+        concurrency=concurrency,
+        succeeded=sum(1 for run in runs if run['ok']),
+        throughput_per_sec=round(iterations / total_wall, 3),
+        p50=percentile(walls, 50),
+        p95=percentile(walls, 95),
+        p99=percentile(walls, 99),
+        module_elapsed_p50=percentile(module_elapsed, 50),
+        maxrss_mb=max(run['maxrss_mb'] for run in runs),
+        server_requests=server.state.requests,
+        server_failures=server.state.failures
+    )
+
+def measure_import_times(python):
+    results = {}
+    for module_name in IMPORTS:
+        process = subprocess.run([python, '-X', 'importtime', '-c', f'import {module_name}'], capture_output=True, text=True)
+        if process.returncode != 0:
+            results[module_name] = None
+            continue
+        # the last line is the requested module with its cumulative time in microseconds
+        cumulative = int(process.stderr.strip().splitlines()[-1].split('|')[1])
+        results[module_name] = round(cumulative / 1000000.0, 4)
+    return results
+
+def print_report(report):
+    print("Import time (seconds, cumulative)")
+    for module_name, seconds in report['imports'].items():
+        print(f"  {module_name:<40} {'n/a' if seconds is None else seconds}")
+    print()
+
+    columns = ['scenario', 'succeeded', 'throughput_per_sec', 'p50', 'p95', 'p99', 'module_elapsed_p50', 'maxrss_mb', 'server_requests']
+    print(f"{columns[0]:<24}" + "  ".join(f"{column:>18}" for column in columns[1:]))
+    for result in report['scenarios']:
+        row = []
+        for column in columns[1:]:
+            value = result[column]
+            if column == 'succeeded':
+                value = f"{value}/{result['iterations']}"
+            row.append(f"{'-' if value is None else value:>18}")
+        print(f"{result['scenario']:<24}" + "  ".join(row))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the OpenAI Ansible modules against a local mock server")
+    parser.add_argument('--iterations', type=int, default=10, help='measured module runs per scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='parallel module runs, similar to ansible forks')
+    parser.add_argument('--scenario', action='append', help='only run the named scenario (repeatable)')
+    parser.add_argument('--model-name', default='mock-model')
+    parser.add_argument('--json', dest='json_path', help='also write the report to this file')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['ANSIBLE_LIBRARY'] = os.pathsep.join([os.path.join(REPO_DIR, 'library'), os.path.join(BENCH_DIR, 'tools')])
+    env['ANSIBLE_MODULE_UTILS'] = os.path.join(REPO_DIR, 'module_utils')
+    env['ANSIBLE_LOCALHOST_WARNING'] = 'False'
+    env['ANSIBLE_PYTHON_INTERPRETER'] = sys.executable
+
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenario or scenario['name'] in args.scenario]
+    report = dict(
+        imports=measure_import_times(sys.executable),
+        scenarios=[run_scenario(scenario, args.iterations, args.concurrency, args.model_name, env) for scenario in scenarios]
+    )
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
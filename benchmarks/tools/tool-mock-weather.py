@@ -0,0 +1,37 @@
+import time
+
+tool_name = "get_weather"
+
+tool_prompt_addendum = f"Always use the {tool_name} tool to get the current temperature in fahrenheit for a given location or city based on its latitude and longitude."
+
+# simulated backend round trip
+TOOL_LATENCY = 0.05
+
+# mirrors library/tool-weather.py
+tool_cache_ttl = 900
+
+def tool_normalize_args(args):
+    return dict(latitude=round(float(args["latitude"]), 2), longitude=round(float(args["longitude"]), 2))
+
+def tool_function(ansible_module, args, context=None):
+    time.sleep(TOOL_LATENCY)
+    return 72.5
+
+
+tool_definition = {
+    "type": "function",
+    "function": {
+        "name": tool_name,
+        "description": "Get current temperature for provided coordinates in fahrenheit.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "latitude": {"type": "number"},
+                "longitude": {"type": "number"}
+            },
+            "required": ["latitude", "longitude"],
+            "additionalProperties": False
+        },
+        "strict": True
+    }
+}
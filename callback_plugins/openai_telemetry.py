@@ -0,0 +1,173 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+name: openai_telemetry
+
+short_description: Aggregates LLM telemetry from the OpenAI modules across a playbook run
+
+version_added: "1.0.0"
+
+description:
+    - Collects the openai_metrics result returned by the openai-chat and openai-summarize modules.
+    - Aggregates latency, token usage, tool calls, cache hits and retries per play, host and model.
+    - Prints a summary at the end of the run and optionally writes it as JSON or OpenMetrics text.
+
+type: aggregate
+
+requirements:
+    - enable in configuration
+
+options:
+    output_path:
+        description: File the aggregated telemetry is written to at the end of the run
+        type: path
+        env:
+            - name: OPENAI_TELEMETRY_OUTPUT
+        ini:
+            - section: callback_openai_telemetry
+              key: output_path
+    output_format:
+        description: Format of the output file
+        type: str
+        default: json
+        choices: [ json, openmetrics ]
+        env:
+            - name: OPENAI_TELEMETRY_FORMAT
+        ini:
+            - section: callback_openai_telemetry
+              key: output_format
+
+author:
+    - Lee Roland (@glroland)
+'''
+
+import json
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+# keys of openai_metrics summed across tasks, matching module_utils/openai_metrics.py
+COUNTERS = ('llm_calls', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'tool_calls',
+            'cache_hits', 'cache_misses', 'retries', 'hedged_requests', 'failed')
+TIMERS = ('elapsed', 'llm_latency', 'tool_latency', 'queue_wait')
+
+OPENMETRICS_HELP = dict(
+    tasks='Module invocations that returned telemetry',
+    failed_tasks='Module invocations that failed',
+    llm_calls='Completions sent to an endpoint',
+    prompt_tokens='Prompt tokens reported by the endpoint',
+    completion_tokens='Completion tokens reported by the endpoint',
+    total_tokens='Total tokens reported by the endpoint',
+    tool_calls='Tool invocations',
+    cache_hits='Responses served from a cache',
+    cache_misses='Cache lookups that missed',
+    retries='Retried requests',
+    hedged_requests='Requests duplicated to a second endpoint',
+    failed='Failed prompts',
+    elapsed='Seconds spent in the modules',
+    llm_latency='Seconds spent waiting on endpoints',
+    tool_latency='Seconds spent in tool invocations',
+    queue_wait='Seconds spent waiting on client side rate limits'
+)
+
+def new_totals():
+    totals = dict(tasks=0, failed_tasks=0)
+    for counter in COUNTERS:
+        totals[counter] = 0
+    for timer in TIMERS:
+        totals[timer] = 0.0
+    return totals
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'openai_telemetry'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        self.play_name = None
+        self.start_time = time.time()
+        self.totals = {}
+
+    def v2_playbook_on_play_start(self, play):
+        self.play_name = play.get_name().strip()
+
+    def record(self, host, metrics, task_failed):
+        key = (self.play_name or '', host, metrics.get('model') or '')
+        totals = self.totals.setdefault(key, new_totals())
+        totals['tasks'] += 1
+        if task_failed:
+            totals['failed_tasks'] += 1
+        for name in COUNTERS + TIMERS:
+            totals[name] += metrics.get(name) or 0
+
+    def record_result(self, result, task_failed):
+        host = result._host.get_name()
+        module_result = result._result
+
+        # looped tasks carry one result per item
+        items = module_result.get('results') if isinstance(module_result.get('results'), list) else [module_result]
+        for item in items:
+            if isinstance(item, dict) and isinstance(item.get('openai_metrics'), dict):
+                self.record(host, item['openai_metrics'], task_failed or item.get('failed', False))
+
+    def v2_runner_on_ok(self, result):
+        self.record_result(result, False)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self.record_result(result, True)
+
+    def report(self):
+        rows = []
+        for (play, host, model), totals in sorted(self.totals.items()):
+            row = dict(play=play, host=host, model=model)
+            row.update(totals)
+            for timer in TIMERS:
+                row[timer] = round(row[timer], 4)
+            row['completion_tokens_per_second'] = None
+            if row['llm_latency'] > 0:
+                row['completion_tokens_per_second'] = round(row['completion_tokens'] / row['llm_latency'], 2)
+            rows.append(row)
+        return dict(started=self.start_time, finished=time.time(), results=rows)
+
+    def openmetrics(self, report):
+        lines = []
+        for name in ('tasks', 'failed_tasks') + COUNTERS + TIMERS:
+            metric = f"openai_{name}_seconds" if name in TIMERS else f"openai_{name}"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"# HELP {metric} {OPENMETRICS_HELP[name]}")
+            for row in report['results']:
+                labels = ",".join(f'{label}="{escape_label(row[label])}"' for label in ('play', 'host', 'model'))
+                lines.append(f"{metric}_total{{{labels}}} {row[name]}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def v2_playbook_on_stats(self, stats):
+        if len(self.totals) == 0:
+            return
+        report = self.report()
+
+        self._display.banner("OPENAI TELEMETRY")
+        for row in report['results']:
+            self._display.display(
+                f"{row['play']} | {row['host']} | {row['model']}: tasks={row['tasks']} llm_calls={row['llm_calls']} "
+                f"llm_latency={row['llm_latency']}s tokens={row['prompt_tokens']}+{row['completion_tokens']} "
+                f"tok/s={row['completion_tokens_per_second']} tool_calls={row['tool_calls']} "
+                f"cache_hits={row['cache_hits']} retries={row['retries']} failed={row['failed_tasks']}"
+            )
+
+        output_path = self.get_option('output_path')
+        if output_path != None:
+            with open(output_path, 'w') as f:
+                if self.get_option('output_format') == 'openmetrics':
+                    f.write(self.openmetrics(report))
+                else:
+                    json.dump(report, f, indent=2)
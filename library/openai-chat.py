@@ -22,18 +22,124 @@ options:
         description: OpenAI Endpoint URL (i.e. http://127.0.0.1:8000/v1)
         required: true
         type: str
+    endpoint_urls:
+        description: Additional OpenAI Endpoint URLs serving the same model.  Requests are balanced across endpoint_url and these replicas.
+        required: false
+        type: list
+        elements: str
+    endpoint_weights:
+        description: Routing weights for endpoint_url followed by each of endpoint_urls
+        required: false
+        type: list
+        elements: int
+    routing:
+        description: How requests are balanced across endpoints, randomly by weight or to the endpoint with the fewest outstanding requests relative to its weight
+        required: false
+        type: str
+        choices: [ weighted, least_outstanding ]
+    max_retries:
+        description: Number of times a request is retried after a connection error, timeout, rate limit or server error
+        required: false
+        type: int
+    retry_backoff:
+        description: Base number of seconds for jittered exponential backoff between retries.  A Retry-After header from the server takes precedence.
+        required: false
+        type: float
+    retry_backoff_max:
+        description: Maximum number of seconds to wait between retries
+        required: false
+        type: float
+    hedge_after:
+        description: Number of seconds after which a slow request is duplicated to another endpoint, keeping whichever response arrives first
+        required: false
+        type: float
+    eject_after:
+        description: Number of consecutive failures after which an endpoint is taken out of rotation
+        required: false
+        type: int
+    eject_seconds:
+        description: Number of seconds an ejected endpoint stays out of rotation
+        required: false
+        type: int
+    proxy_socket:
+        description: Unix socket of a local proxy daemon that keeps warm, pooled connections to the endpoints and coalesces identical in-flight requests from parallel forks.  The daemon is started on first use and shared by every later task.
+        required: false
+        type: path
+    proxy_idle_timeout:
+        description: Number of seconds without requests after which the proxy daemon exits
+        required: false
+        type: int
+    rate_limits:
+        description: Client side rate limits shared by every module process on the controller, so that a play with many forks paces itself instead of overloading the endpoint.  Each endpoint and model pair has its own token buckets, stored under rate_limit_dir, and the first entry matching the endpoint and model applies.  Time spent waiting for capacity is reported as queue_wait.
+        required: false
+        type: list
+        elements: dict
+        suboptions:
+            endpoint_url:
+                description: Endpoint the limits apply to, every endpoint when omitted
+                required: false
+                type: str
+            model_name:
+                description: Model the limits apply to, every model when omitted
+                required: false
+                type: str
+            requests_per_second:
+                description: Maximum sustained request rate
+                required: false
+                type: float
+            tokens_per_minute:
+                description: Maximum sustained prompt and completion tokens per minute, estimated before each request from the prompt and max_tokens and corrected from the reported usage
+                required: false
+                type: int
+    rate_limit_dir:
+        description: Directory holding the shared rate limiter state
+        required: false
+        type: path
     model_name:
         description: OpenAI Model Name (must match server expectations)
         required: true
         type: str
     user_content:
-        description: User Content Message (i.e. Your prompt)
-        required: true
+        description: User Content Message (i.e. Your prompt).  Mutually exclusive with prompts.
+        required: false
         type: str
+    prompts:
+        description: List of User Content Messages to send in a single invocation.  Results are returned in input order.  Mutually exclusive with user_content.
+        required: false
+        type: list
+        elements: str
+    batch_concurrency:
+        description: Maximum number of concurrent requests to issue when processing prompts
+        required: false
+        type: int
     system_content:
         description: System Content Message (i.e. Server context to consider when generating response to prompt)
         required: false
         type: str
+    response_schema:
+        description:
+            - JSON schema the response must conform to.  The response is parsed, validated and returned as C(parsed).
+            - Constrained decoding through response_format is requested where the endpoint supports it, falling back to a JSON object response format and then to instructions in the system prompt.
+            - Requires the jsonschema python library.
+        required: false
+        type: dict
+    schema_retries:
+        description: Number of times the LLM is asked to correct a response that is not valid JSON or does not match response_schema.  Only the affected prompt is retried.
+        required: false
+        type: int
+    max_input_tokens:
+        description: Maximum number of prompt tokens, counted locally before dispatch.  User content is trimmed to fit; the system prompt and tool definitions are never trimmed.
+        required: false
+        type: int
+    trim_strategy:
+        description: Which part of oversized user content to keep, the beginning, the end or both ends with the middle removed
+        required: false
+        type: str
+        choices: [ head, tail, head_tail ]
+    dedupe_log_lines:
+        description: Collapse log lines and stack traces that repeat anywhere in the user content to their first occurrence and a repeat count, ignoring timestamps, ids and other numbers, before counting tokens
+        required: false
+        type: bool
     api_key:
         description: OpenAI API Key
         required: false
@@ -79,13 +185,106 @@ options:
         required: false
         type: int
     tool_modules:
-        description: Comma separated list of Python modules containing tools to load
+        description: Comma separated list of Python modules containing tools to load.  Tools are sent, and their prompt addenda appended to the system prompt, in order of tool name so that the prompt prefix does not depend on the order they are listed in.
         required: false
         type: str
+    tool_path:
+        description: Directories searched for tool modules.  Defaults to the OPENAI_TOOL_PATH environment variable, then the ANSIBLE_LIBRARY path, both separated by colons.
+        required: false
+        type: list
+        elements: path
+    tool_manifest:
+        description: File caching the definitions of previously loaded tool modules so tool schemas can be built without importing each tool
+        required: false
+        type: path
+    tool_cache_dir:
+        description: Directory where results of tools that declare a tool_cache_ttl are kept, shared across tasks and forks.  Without it such results are only reused within the task.
+        required: false
+        type: path
+    tool_cache_max_size_mb:
+        description: Maximum size of the tool result cache in megabytes before least recently used entries are evicted
+        required: false
+        type: int
+    tool_workers:
+        description: Maximum number of tool calls to execute concurrently when the LLM requests several tools at once
+        required: false
+        type: int
+    tool_timeout:
+        description: Maximum number of seconds to wait for a single tool call to complete
+        required: false
+        type: int
+    max_tool_rounds:
+        description: Maximum number of rounds of tool calls to execute before the LLM must provide a final response
+        required: false
+        type: int
+    tool_deadline:
+        description: Overall number of seconds allowed for the tool loop, after which the LLM must provide a final response
+        required: false
+        type: int
     log_messages:
         description: Flag indicating whether to log input messages to the LLM
         required: false
         type: bool
+    stream:
+        description: Flag indicating whether to stream the response from the LLM and capture time to first token metrics
+        required: false
+        type: bool
+    cache_dir:
+        description: Directory for the persistent response cache.  Caching is disabled when not provided.
+        required: false
+        type: str
+    cache_ttl:
+        description: Number of seconds a cached response remains valid
+        required: false
+        type: int
+    cache_max_size_mb:
+        description: Maximum size of the response cache in megabytes before least recently used entries are evicted
+        required: false
+        type: int
+    semantic_cache:
+        description:
+            - Reuse the answer to an earlier, near-duplicate prompt, i.e. alerts that differ only in timestamps, pod names, addresses or counters.
+            - Timestamps, ids and numbers are normalized away before the user content is embedded and compared against a memory-mapped index stored in cache_dir.
+            - Only prompts sent with the same model, system prompt and sampling parameters are compared.  Requires cache_dir.
+            - Skipped when tool_modules is provided, as those answers depend on live tool output.
+        required: false
+        type: bool
+    semantic_cache_threshold:
+        description: Minimum cosine similarity between normalized prompts for an earlier answer to be reused
+        required: false
+        type: float
+    semantic_cache_embedding:
+        description: Embed prompts with a local hashing vectorizer, or through the endpoint's embeddings API
+        required: false
+        type: str
+        choices: [ hashing, endpoint ]
+    semantic_cache_embedding_model:
+        description: Embedding model used when semantic_cache_embedding is endpoint, defaulting to model_name
+        required: false
+        type: str
+    semantic_cache_max_entries:
+        description: Number of prompts held in the semantic index before the least recently used are replaced
+        required: false
+        type: int
+    session_id:
+        description:
+            - Continue a conversation across tasks.  Earlier turns stored under this id, including any tool calls, are replayed between the system prompt and user_content and the new turn is stored once it completes.
+            - The history is replayed exactly as it was sent, so each request extends the previous one and servers with prefix caching, i.e. vLLM, skip prefill for everything already seen.
+            - Mutually exclusive with prompts and semantic_cache.
+        required: false
+        type: str
+    session_dir:
+        description: Directory holding the conversation history of each session
+        required: false
+        type: path
+    session_max_turns:
+        description: Number of turns kept in a session.  Once exceeded, the oldest turns are dropped in one block down to half this number, so the replayed prefix only changes every few turns rather than on every call.  When max_input_tokens is set, the older half of the history is likewise dropped as often as needed to fit before any user content is trimmed.
+        required: false
+        type: int
+    session_reset:
+        description: Start the session over, discarding any stored history
+        required: false
+        type: bool
     
 # Specify this value according to your collection
 # in format of namespace.collection.doc_fragment_name
@@ -104,36 +303,970 @@ EXAMPLES = r'''
       model_name: 'models/merlinite-7b-lab-Q4_K_M.gguf'
       user_content: 'Hello AI Platform!  How are you today?'
 
+# Send several prompts from a single task
+  - name: Run OpenAI Chat Module in Batch Mode
+    openai-chat:
+      endpoint_url: 'http://127.0.0.1:8000/v1'
+      model_name: 'models/merlinite-7b-lab-Q4_K_M.gguf'
+      prompts:
+        - 'What is the capital of Georgia?'
+        - 'What is the capital of Massachusetts?'
+      batch_concurrency: 2
+
+# Reuse warm connections across tasks and hosts through a local proxy daemon
+  - name: Run OpenAI Chat Module through the Proxy Daemon
+    openai-chat:
+      endpoint_url: 'https://inference.example.com/v1'
+      model_name: 'models/merlinite-7b-lab-Q4_K_M.gguf'
+      tls_client_cert: '/etc/pki/client.crt'
+      tls_client_key: '/etc/pki/client.key'
+      proxy_socket: '~/.ansible/tmp/openai-proxy.sock'
+      user_content: 'Hello AI Platform!  How are you today?'
+
+# Carry a conversation across tasks
+  - name: Ask a Question
+    openai-chat:
+      endpoint_url: 'http://127.0.0.1:8000/v1'
+      model_name: 'models/merlinite-7b-lab-Q4_K_M.gguf'
+      session_id: 'incident-{{ inventory_hostname }}'
+      user_content: 'Which pods on this node restarted in the last hour?'
+  - name: Ask a Follow Up Question
+    openai-chat:
+      endpoint_url: 'http://127.0.0.1:8000/v1'
+      model_name: 'models/merlinite-7b-lab-Q4_K_M.gguf'
+      session_id: 'incident-{{ inventory_hostname }}'
+      user_content: 'What do those pods have in common?'
+
 '''
 
 RETURN = r'''
 # These are examples of possible return values, and in general should use other names for return values.
+response:
+    description: Response content from the LLM (single prompt mode)
+    type: str
+    returned: when user_content is provided
+responses:
+    description: Per prompt results, in the same order as the prompts input
+    type: list
+    elements: dict
+    returned: when prompts is provided
+    contains:
+        prompt:
+            description: Prompt submitted to the LLM
+            type: str
+        response:
+            description: Response content from the LLM
+            type: str
+        failed:
+            description: Flag indicating whether this prompt failed
+            type: bool
+        msg:
+            description: Error message when the prompt failed
+            type: str
+        metrics:
+            description: Timing and token usage metrics for the final LLM call of this prompt
+            type: dict
+        rounds:
+            description: Per round timing for this prompt (see rounds below)
+            type: list
+        usage:
+            description: Cumulative token usage for this prompt
+            type: dict
+parsed:
+    description: Response parsed as JSON and validated against response_schema, also returned per prompt in batch mode
+    type: raw
+    returned: when response_schema is provided
+schema_retries:
+    description: Number of times the LLM was asked to correct its response to match response_schema
+    type: int
+    returned: when response_schema is provided
+prompt_tokens:
+    description: Locally counted prompt tokens after deduplication and trimming, also returned per prompt in batch mode
+    type: dict
+    returned: when max_input_tokens or dedupe_log_lines is set
+    contains:
+        system:
+            description: Tokens used by the system prompt, tool definitions and message framing
+            type: int
+        user:
+            description: Tokens used by the user content as sent
+            type: int
+        total:
+            description: Total prompt tokens as sent
+            type: int
+        budget:
+            description: The max_input_tokens budget
+            type: int
+        trimmed_tokens:
+            description: Tokens removed from the user content to fit the budget
+            type: int
+metrics:
+    description: Timing and token usage metrics for the final LLM call
+    type: dict
+    returned: when user_content is provided
+    contains:
+        latency:
+            description: Total seconds spent waiting on the LLM call
+            type: float
+        time_to_first_token:
+            description: Seconds until the first content or tool call delta arrived (stream mode only)
+            type: float
+        completion_tokens:
+            description: Number of tokens generated by the LLM
+            type: int
+        tokens_per_second:
+            description: Generation throughput, measured from the first token when streaming
+            type: float
+        usage:
+            description: Usage block reported by the server
+            type: dict
+        cached:
+            description: Flag indicating whether the completion was served from the response cache
+            type: bool
+        queue_wait:
+            description: Seconds spent waiting on rate_limits before the request was sent
+            type: float
+        endpoint:
+            description: Endpoint that served the completion, null when it was served from a cache
+            type: str
+rounds:
+    description: Timing for each LLM call made during the tool loop and the tool calls it requested
+    type: list
+    elements: dict
+    returned: when user_content is provided
+    contains:
+        round:
+            description: Round number, starting at 1
+            type: int
+        llm:
+            description: Timing and token usage metrics for the LLM call of this round
+            type: dict
+        tool_calls:
+            description: Name, id and latency of each tool call requested in this round
+            type: list
+usage:
+    description: Token usage summed across every LLM call
+    type: dict
+    returned: when user_content is provided
+elapsed:
+    description: Total seconds spent in the LLM and tool loop
+    type: float
+    returned: when user_content is provided
+session:
+    description: Conversation history statistics
+    type: dict
+    returned: when session_id is provided
+    contains:
+        id:
+            description: Session id
+            type: str
+        turns:
+            description: Turns stored in the session, including this one
+            type: int
+        history_messages:
+            description: Messages replayed from earlier turns ahead of user_content
+            type: int
+        dropped_turns:
+            description: Oldest turns dropped from the session by this task to stay within session_max_turns
+            type: int
+routing:
+    description: Retry, hedging and per endpoint request statistics
+    type: dict
+    returned: always
+    contains:
+        retries:
+            description: Number of retried requests
+            type: int
+        hedged_requests:
+            description: Number of requests duplicated to a second endpoint
+            type: int
+        endpoints:
+            description: Requests, failures and ejection state per endpoint
+            type: list
+cache_hits:
+    description: Number of chat completions served from the response cache
+    type: int
+    returned: when cache_dir is provided
+tool_cache_hits:
+    description: Number of tool calls answered from a duplicate call in the same task or from tool_cache_dir
+    type: int
+    returned: when tool_modules is provided
+semantic_cache:
+    description: Whether the answer was reused from a near-duplicate prompt, and the similarity of the closest earlier prompt, also returned per prompt in batch mode
+    type: dict
+    returned: when semantic_cache is enabled
+openai_metrics:
+    description: Consolidated telemetry for the whole module run, aggregated across a play by the openai_telemetry callback plugin
+    type: dict
+    returned: always, except in check mode and when argument validation fails
+    contains:
+        module:
+            description: Name of the module that produced the metrics
+            type: str
+        model:
+            description: Model name
+            type: str
+        endpoint:
+            description: Configured endpoints
+            type: str
+        elapsed:
+            description: Seconds spent in the module after argument validation
+            type: float
+        llm_calls:
+            description: Chat completions sent to an endpoint, excluding cache hits
+            type: int
+        llm_latency:
+            description: Total seconds spent waiting on the endpoint
+            type: float
+        prompt_tokens:
+            description: Prompt tokens reported by the endpoint
+            type: int
+        completion_tokens:
+            description: Completion tokens reported by the endpoint
+            type: int
+        total_tokens:
+            description: Total tokens reported by the endpoint
+            type: int
+        tool_calls:
+            description: Tool invocations
+            type: int
+        tool_latency:
+            description: Total seconds spent in tool invocations
+            type: float
+        queue_wait:
+            description: Total seconds spent waiting on rate_limits
+            type: float
+        cache_hits:
+            description: Chat completions served from the response cache
+            type: int
+        cache_misses:
+            description: Chat completions looked up in the response cache but not found
+            type: int
+        retries:
+            description: Retried requests
+            type: int
+        hedged_requests:
+            description: Requests duplicated to a second endpoint
+            type: int
+        failed:
+            description: Failed prompts
+            type: int
 '''
 
-from ansible.module_utils.basic import AnsibleModule
-import openai
-from openai import OpenAI
-import httpx
-import importlib.util
-import sys
+from ansible.module_utils.basic import AnsibleModule, missing_required_lib
+from ansible.module_utils.openai_cache import ResponseCache, canonical_hash
+from ansible.module_utils.openai_tools import ToolRegistry, ToolLoadError
+from ansible.module_utils.openai_routing import Endpoint, EndpointPool
+from ansible.module_utils.openai_proxy import ensure_proxy_daemon, create_proxy_transport
+from ansible.module_utils.openai_tokens import count_tokens, count_message_tokens, dedupe_log_lines, truncate_tokens
+from ansible.module_utils.openai_metrics import new_metrics, add_usage, finish_metrics
+from ansible.module_utils.openai_semantic_cache import SemanticIndex, normalize_prompt, hashing_embedding, unit_vector
+from ansible.module_utils.openai_schema import RESPONSE_FORMAT_MODES, get_validator, response_format, schema_instructions, parse_response
+from ansible.module_utils.openai_ratelimit import RateLimiter
+from ansible.module_utils.openai_sessions import ConversationSession
 import json
+import os
+import threading
+import time
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+class PromptTooLargeError(Exception):
+    pass
+
+class SchemaValidationError(Exception):
+    def __init__(self, message, response):
+        super().__init__(message)
+        self.response = response
+
+class ChatContext:
+    """ State shared by every chat completion issued during a single module run """
+
+    def __init__(self, module, endpoints, cache=None, semantic_cache=False, rate_limiters=None, session=None):
+        self.module = module
+        self.endpoints = endpoints
+        self.rate_limiters = rate_limiters or {}
+        self.session = session
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.response_format_mode = RESPONSE_FORMAT_MODES[0]
+        # every completion and tool call as it returns, so that telemetry also covers failed chats
+        self.completions = []
+        self.tool_calls = []
+        self.lock = threading.Lock()
+
+    def record_completion(self, metrics):
+        with self.lock:
+            self.completions.append(metrics)
+
+    def record_tool_call(self, metrics):
+        with self.lock:
+            self.tool_calls.append(metrics)
+
+    def record_cache_lookup(self, hit):
+        with self.lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def downgrade_response_format(self, rejected_mode):
+        """ Step down to the next weaker response format after the endpoint rejected rejected_mode """
+        with self.lock:
+            if self.response_format_mode == rejected_mode:
+                self.response_format_mode = RESPONSE_FORMAT_MODES[RESPONSE_FORMAT_MODES.index(rejected_mode) + 1]
+                self.module.warn(f"Endpoint rejected response_format {rejected_mode}, falling back to {self.response_format_mode}")
+            return self.response_format_mode
+
+# Ansible's default module search path, used when neither tool_path nor ANSIBLE_LIBRARY is set
+DEFAULT_TOOL_PATH = ['~/.ansible/plugins/modules', '/usr/share/ansible/plugins/modules']
+
+def tool_search_path(module):
+    if module.params['tool_path'] != None:
+        return module.params['tool_path']
+    # environment paths are separated like PATH, not by commas as a list option would be
+    for variable in ('OPENAI_TOOL_PATH', 'ANSIBLE_LIBRARY'):
+        if os.environ.get(variable):
+            return [os.path.expanduser(path) for path in os.environ[variable].split(os.pathsep) if len(path) > 0]
+    return DEFAULT_TOOL_PATH
+
+def completion_cache_key(module, contentMessages, tools_list_for_openai, requested_format=None):
+    return canonical_hash(dict(
+        endpoint_url=module.params['endpoint_url'],
+        model=module.params['model_name'],
+        messages=contentMessages,
+        temperature=module.params['temperature'],
+        max_tokens=module.params['max_tokens'],
+        top_p=module.params['top_p'],
+        frequency_penalty=module.params['frequency_penalty'],
+        presence_penalty=module.params['presence_penalty'],
+        tools=tools_list_for_openai,
+        response_format=requested_format
+    ))
+
+def semantic_scope(module, system_prompt, tools_list_for_openai):
+    """ Everything besides the user content that must match for a prior answer to be reused """
+    return canonical_hash(dict(
+        endpoint_url=module.params['endpoint_url'],
+        model=module.params['model_name'],
+        system=system_prompt,
+        tools=tools_list_for_openai,
+        temperature=module.params['temperature'],
+        max_tokens=module.params['max_tokens'],
+        top_p=module.params['top_p'],
+        frequency_penalty=module.params['frequency_penalty'],
+        presence_penalty=module.params['presence_penalty'],
+        response_schema=module.params['response_schema'],
+        embedding=module.params['semantic_cache_embedding'],
+        embedding_model=module.params['semantic_cache_embedding_model']
+    ))
+
+def embed_prompt(ctx, text):
+    module = ctx.module
+    if module.params['semantic_cache_embedding'] == 'hashing':
+        return hashing_embedding(text)
+
+    embedding_model = module.params['semantic_cache_embedding_model'] or module.params['model_name']
+    response = ctx.endpoints.call(lambda endpoint: endpoint.client.embeddings.create(model=embedding_model, input=text))
+    return unit_vector(response.data[0].embedding)
+
+def semantic_lookup(ctx, system_prompt, user_content, tools_list_for_openai):
+    """ Prior answer to a near-duplicate prompt, as (answer, similarity, entry) where entry is used to store a new answer """
+    import openai
 
-def dynamically_load_python_module(file_path, module_name=None):
-    if module_name is None:
-        module_name = "my_module"
-    spec = importlib.util.spec_from_file_location(module_name, file_path)
-    module = importlib.util.module_from_spec(spec)
-    sys.modules[module_name] = module
-    spec.loader.exec_module(module)
-    return module
+    module = ctx.module
+    scope = semantic_scope(module, system_prompt, tools_list_for_openai)
+    try:
+        vector = embed_prompt(ctx, normalize_prompt(user_content))
+    except openai.APIError as e:
+        module.warn(f"Unable to embed prompt, skipping the semantic cache: {e}")
+        return None, None, None
+
+    index = SemanticIndex(module.params['cache_dir'], len(vector), capacity=module.params['semantic_cache_max_entries'])
+    key, similarity = index.lookup(scope, vector, module.params['semantic_cache_threshold'])
+    answer = None
+    if key != None:
+        answer = ctx.cache.get(key)
+        if answer == None:
+            # the answer expired or was evicted from the response cache
+            index.remove(key)
+
+    # misses are recorded by the exact match lookup that follows
+    if answer != None:
+        ctx.record_cache_lookup(True)
+        return answer, similarity, None
+    return None, similarity, (index, scope, vector, canonical_hash(dict(scope=scope, prompt=normalize_prompt(user_content))))
+
+def completion_metrics(completion, latency, time_to_first_token=None, cached=False, queue_wait=0.0, endpoint=None):
+    """ Metrics of a single completion, completion is None for answers reused from the semantic cache """
+    usage = None
+    completion_tokens = None
+    if completion != None and completion.usage != None:
+        usage = completion.usage.model_dump(mode='json')
+        completion_tokens = completion.usage.completion_tokens
+
+    # measure generation throughput from the first token when streaming so that
+    # queueing and prefill time do not skew the rate
+    tokens_per_second = None
+    generation_time = latency if time_to_first_token == None else latency - time_to_first_token
+    if completion_tokens and generation_time > 0:
+        tokens_per_second = round(completion_tokens / generation_time, 2)
+
+    return dict(
+        latency=round(latency, 4),
+        time_to_first_token=None if time_to_first_token == None else round(time_to_first_token, 4),
+        completion_tokens=completion_tokens,
+        tokens_per_second=tokens_per_second,
+        usage=usage,
+        cached=cached,
+        queue_wait=round(queue_wait, 4),
+        endpoint=endpoint
+    )
+
+def stream_completion(openai_client, request_args):
+    from openai.types.chat import ChatCompletion
+
+    start_time = time.monotonic()
+    first_token_time = None
+
+    completion = dict(id=None, object="chat.completion", created=0, model=request_args['model'], choices=[], usage=None)
+    content_parts = []
+    tool_calls = {}
+    finish_reason = None
+
+    stream = openai_client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request_args)
+    for chunk in stream:
+        completion['id'] = chunk.id
+        completion['created'] = chunk.created
+        completion['model'] = chunk.model
+        if chunk.usage != None:
+            completion['usage'] = chunk.usage.model_dump(mode='json')
+
+        for choice in chunk.choices:
+            delta = choice.delta
+            if first_token_time == None and (delta.content or delta.tool_calls):
+                first_token_time = time.monotonic()
+            if delta.content:
+                content_parts.append(delta.content)
+
+            # tool calls arrive as fragments keyed by index that must be stitched back together
+            for tool_call_delta in delta.tool_calls or []:
+                tool_call = tool_calls.setdefault(tool_call_delta.index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+                if tool_call_delta.id:
+                    tool_call['id'] = tool_call_delta.id
+                if tool_call_delta.function != None:
+                    if tool_call_delta.function.name:
+                        tool_call['function']['name'] += tool_call_delta.function.name
+                    if tool_call_delta.function.arguments:
+                        tool_call['function']['arguments'] += tool_call_delta.function.arguments
+
+            if choice.finish_reason != None:
+                finish_reason = choice.finish_reason
+
+    latency = time.monotonic() - start_time
+
+    message = {"role": "assistant", "content": "".join(content_parts) if len(content_parts) > 0 else None}
+    if len(tool_calls) > 0:
+        message['tool_calls'] = [tool_calls[index] for index in sorted(tool_calls)]
+    completion['choices'] = [{"index": 0, "message": message, "finish_reason": finish_reason or "stop"}]
+    completion = ChatCompletion.model_validate(completion)
+
+    time_to_first_token = None if first_token_time == None else first_token_time - start_time
+    return completion, completion_metrics(completion, latency, time_to_first_token)
+
+def rejects_response_format(error):
+    """ Whether a 400 from the endpoint refers to the requested response_format rather than the request as a whole """
+    param = getattr(error, 'param', None)
+    if param != None:
+        return 'response_format' in str(param)
+    message = str(getattr(error, 'message', None) or error)
+    return 'response_format' in message or 'json_schema' in message
+
+def create_completion(ctx, contentMessages, tools_list_for_openai, response_schema=None):
+    import openai
+    from openai.types.chat import ChatCompletion
+
+    module = ctx.module
+    if module.params['log_messages']:
+        module.warn(f"Input Messages to LLM: {contentMessages}")
+
+    format_mode = ctx.response_format_mode
+    requested_format = None if response_schema == None else response_format(response_schema, format_mode)
+
+    cache_key = None
+    if ctx.cache != None:
+        cache_key = completion_cache_key(module, contentMessages, tools_list_for_openai, requested_format)
+        cached_completion = ctx.cache.get(cache_key)
+        ctx.record_cache_lookup(cached_completion != None)
+        if cached_completion != None:
+            completion = ChatCompletion.model_validate(cached_completion)
+            return completion, completion_metrics(completion, 0, cached=True)
+
+    request_args = dict(
+        model=module.params['model_name'],
+        messages=contentMessages,
+        temperature=module.params['temperature'],
+        max_tokens=module.params['max_tokens'],
+        top_p=module.params['top_p'],
+        frequency_penalty=module.params['frequency_penalty'],
+        presence_penalty=module.params['presence_penalty']
+    )
+    if tools_list_for_openai != None:
+        request_args['tools'] = tools_list_for_openai
+    if requested_format != None:
+        request_args['response_format'] = requested_format
+
+    # reserve the prompt and the longest possible reply, the difference is returned once usage is known
+    reserved_tokens = 0
+    if any(limiter.tokens_per_minute != None for limiter in ctx.rate_limiters.values()):
+        reserved_tokens = count_message_tokens(contentMessages, tools_list_for_openai, module.params['model_name']) + (module.params['max_tokens'] or 0)
+
+    def request(endpoint):
+        limiter = ctx.rate_limiters.get(endpoint.url)
+        queue_wait = 0.0
+        if limiter != None:
+            queue_wait = limiter.acquire(reserved_tokens)
+
+        if module.params['stream']:
+            completion, metrics = stream_completion(endpoint.client, request_args)
+        else:
+            start_time = time.monotonic()
+            completion = endpoint.client.chat.completions.create(**request_args)
+            metrics = completion_metrics(completion, time.monotonic() - start_time)
+
+        if limiter != None:
+            limiter.settle(reserved_tokens, None if completion.usage == None else completion.usage.total_tokens)
+        metrics['queue_wait'] = round(queue_wait, 4)
+        metrics['endpoint'] = endpoint.url
+        return completion, metrics
+
+    try:
+        completion, metrics = ctx.endpoints.call(request)
+    except openai.BadRequestError as e:
+        # not every OpenAI compatible server implements constrained decoding, any other
+        # rejection such as an oversized prompt or unknown model is not retried
+        if requested_format == None or not rejects_response_format(e):
+            raise
+        ctx.downgrade_response_format(format_mode)
+        return create_completion(ctx, contentMessages, tools_list_for_openai, response_schema)
+    ctx.record_completion(metrics)
+
+    if cache_key != None:
+        ctx.cache.put(cache_key, completion.model_dump(mode='json'))
+
+    return completion, metrics
+
+def invoke_tool_calls(ctx, tool_calls, deadline=None):
+    """ Execute the requested tool calls concurrently, returning (tool_call, result, duration) in request order """
+    module = ctx.module
+    num_workers = max(1, min(module.params['tool_workers'], len(tool_calls)))
+    tool_timeout = module.params['tool_timeout']
+    if deadline != None:
+        tool_timeout = max(0, min(tool_timeout, deadline - time.monotonic()))
+
+    pending = queue.Queue()
+    futures = []
+    for tool_call, tool_module, args in tool_calls:
+        future = Future()
+        futures.append(future)
+        pending.put((tool_module, args, future))
+
+    def worker():
+        while True:
+            try:
+                tool_module, args, future = pending.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            start_time = time.monotonic()
+            try:
+                tool_result = tool_module.tool_function(module, args)
+                future.set_result((tool_result, time.monotonic() - start_time))
+            except BaseException as e:
+                future.set_exception(e)
+
+    # daemon threads so that a hung tool cannot block the module from exiting after it times out
+    for i in range(num_workers):
+        threading.Thread(target=worker, daemon=True).start()
+
+    # calls beyond the worker count queue behind earlier ones, so allow one timeout per wave
+    dispatch_time = time.monotonic()
+    results = []
+    for index, future in enumerate(futures):
+        tool_call = tool_calls[index][0]
+        deadline = dispatch_time + tool_timeout * (index // num_workers + 1)
+        try:
+            tool_result, duration = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            duration = time.monotonic() - dispatch_time
+            tool_result = f"Tool {tool_call.function.name} timed out after {tool_timeout} seconds"
+            module.warn(tool_result)
+        except Exception as e:
+            # a failing backend is reported to the LLM like a timeout rather than failing the whole task
+            duration = time.monotonic() - dispatch_time
+            tool_result = f"Tool {tool_call.function.name} failed: {e}"
+            module.warn(tool_result)
+        results.append((tool_call, tool_result, duration))
+
+    return results
+
+def accumulate_usage(usage, metrics):
+    if metrics['usage'] != None:
+        for key in usage:
+            usage[key] += metrics['usage'].get(key) or 0
+
+def fit_prompt(module, system_prompt, user_content, tools_list_for_openai, session=None):
+    """ Dedupe and trim the user content so the prompt fits within max_input_tokens, first dropping old session turns """
+    model_name = module.params['model_name']
+    max_input_tokens = module.params['max_input_tokens']
+
+    if module.params['dedupe_log_lines']:
+        user_content = dedupe_log_lines(user_content)
+
+    system_messages = [] if system_prompt == None or len(system_prompt) == 0 else [{"role": "system", "content": system_prompt}]
+    def count_fixed_tokens():
+        history = [] if session == None else session.messages()
+        return count_message_tokens(system_messages + history + [{"role": "user", "content": ""}], tools_list_for_openai, model_name)
+
+    fixed_tokens = count_fixed_tokens()
+    user_tokens = count_tokens(user_content, model_name)
+
+    # old turns are dropped in blocks, like the session window, so the replayed prefix stays stable
+    if session != None and max_input_tokens != None:
+        dropped_turns = session.dropped_turns
+        while fixed_tokens + user_tokens > max_input_tokens and session.drop_oldest():
+            fixed_tokens = count_fixed_tokens()
+        if session.dropped_turns > dropped_turns:
+            module.warn(f"Dropped the {session.dropped_turns - dropped_turns} oldest session turns to fit max_input_tokens of {max_input_tokens}")
+
+    prompt_tokens = dict(
+        system=fixed_tokens,
+        user=user_tokens,
+        total=fixed_tokens + user_tokens,
+        budget=max_input_tokens,
+        trimmed_tokens=0
+    )
+    if max_input_tokens == None or prompt_tokens['total'] <= max_input_tokens:
+        return user_content, prompt_tokens
+
+    # the system prompt, tool addenda, tool definitions and remaining session history are never trimmed
+    user_budget = max_input_tokens - fixed_tokens
+    if user_budget <= 0:
+        raise PromptTooLargeError(f"System prompt, tool definitions and session history use {fixed_tokens} tokens, exceeding max_input_tokens of {max_input_tokens}")
+
+    user_content = truncate_tokens(user_content, user_budget, module.params['trim_strategy'], model_name)
+    prompt_tokens['user'] = count_tokens(user_content, model_name)
+    prompt_tokens['total'] = fixed_tokens + prompt_tokens['user']
+    prompt_tokens['trimmed_tokens'] = user_tokens - prompt_tokens['user']
+    module.warn(f"User content trimmed by {prompt_tokens['trimmed_tokens']} tokens ({module.params['trim_strategy']}) to fit max_input_tokens of {max_input_tokens}")
+    return user_content, prompt_tokens
+
+def run_chat(ctx, system_prompt, user_content, tools_by_name, tools_list_for_openai):
+    module = ctx.module
+    start_time = time.monotonic()
+    prompt_tokens = None
+    if module.params['max_input_tokens'] != None or module.params['dedupe_log_lines']:
+        user_content, prompt_tokens = fit_prompt(module, system_prompt, user_content, tools_list_for_openai, ctx.session)
+    history = [] if ctx.session == None else ctx.session.messages()
+
+    semantic_entry = None
+    if ctx.semantic_cache:
+        answer, similarity, semantic_entry = semantic_lookup(ctx, system_prompt, user_content, tools_list_for_openai)
+        if answer != None:
+            chat_result = dict(
+                original_messages=[message for message in [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_content}] if message['content']],
+                response=answer['response'],
+                metrics=completion_metrics(None, 0, cached=True),
+                rounds=[],
+                usage=dict(prompt_tokens=0, completion_tokens=0, total_tokens=0),
+                elapsed=round(time.monotonic() - start_time, 4),
+                semantic_cache=dict(hit=True, similarity=round(similarity, 4))
+            )
+            if prompt_tokens != None:
+                chat_result['prompt_tokens'] = prompt_tokens
+            if module.params['response_schema'] != None:
+                chat_result['parsed'] = answer.get('parsed')
+                chat_result['schema_retries'] = 0
+            return chat_result
+
+    deadline = None
+    if module.params['tool_deadline'] != None:
+        deadline = start_time + module.params['tool_deadline']
+
+    # Create OpenAI chat message input, replaying any session history between the system prompt and the new question
+    systemMessages = []
+    if system_prompt != None and len(system_prompt) > 0:
+        systemMessages = [ {"role": "system", "content": system_prompt} ]
+    userContentMessage = {"role": "user", "content": user_content}
+    contentMessages = systemMessages + history + [ userContentMessage ]
+    original_messages = systemMessages + [ userContentMessage ]
+
+    rounds = []
+    usage = dict(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+    tools_for_round = tools_list_for_openai
+    response_schema = module.params['response_schema']
+    parsed = None
+    schema_retries = 0
+    while True:
+        # the response format is only requested once tools are withheld so that constrained
+        # decoding cannot prevent the LLM from calling a tool
+        completion, metrics = create_completion(ctx, contentMessages, tools_for_round, response_schema if tools_for_round == None else None)
+        accumulate_usage(usage, metrics)
+        round_metrics = dict(round=len(rounds) + 1, llm=metrics, tool_calls=[])
+        rounds.append(round_metrics)
+
+        message = completion.choices[0].message
+        tool_calls_requested = message.tool_calls != None and len(message.tool_calls) > 0
+        if tool_calls_requested and tools_for_round == None:
+            # some servers return tool calls even when no tools are offered, these are never run
+            # so that the round budget and deadline actually end the loop
+            module.warn(f"Ignoring {len(message.tool_calls)} tool calls requested by LLM after tools were withheld, using its response as final")
+            tool_calls_requested = False
+        if not tool_calls_requested:
+            if response_schema == None:
+                break
+            parsed, errors = parse_response(message.content, response_schema)
+            if len(errors) == 0:
+                break
+
+            # ask again for just this conversation rather than failing the whole task
+            if schema_retries >= module.params['schema_retries']:
+                raise SchemaValidationError(f"Response does not match response_schema after {schema_retries} retries: {'; '.join(errors)}", message.content)
+            schema_retries += 1
+            module.warn(f"Response does not match response_schema, retrying ({schema_retries} of {module.params['schema_retries']}): {'; '.join(errors)}")
+            contentMessages.append({"role": "assistant", "content": message.content})
+            contentMessages.append({"role": "user", "content": f"Your reply does not match the required JSON schema: {'; '.join(errors)}. Reply again with only the corrected JSON document."})
+            tools_for_round = None
+            continue
+
+        num_tool_calls = len(message.tool_calls)
+        tool_counter = 0
+
+        tool_calls = []
+        rejected_tool_calls = []
+        for tool_call in message.tool_calls:
+            tool_counter += 1
+            tool_name = tool_call.function.name
+            # malformed arguments and unknown tools are reported back to the LLM so it can correct the call
+            try:
+                args = json.loads(tool_call.function.arguments)
+            except ValueError as e:
+                rejected_tool_calls.append((tool_call, f"Invalid JSON arguments for tool {tool_name}: {e}"))
+                module.warn(rejected_tool_calls[-1][1])
+                continue
+            module.warn(f"Tool Invocation ({tool_counter} of {num_tool_calls}) Requested by LLM: {tool_name} with args: {args}")
+
+            if tool_name not in tools_by_name:
+                rejected_tool_calls.append((tool_call, f"Unable to find tool module corresponding to tool request: {tool_name}"))
+                module.warn(rejected_tool_calls[-1][1])
+                continue
+            tool_calls.append((tool_call, tools_by_name[tool_name], args))
+
+        contentMessages.append({
+            "role": "assistant",
+            "content": message.content,
+            "tool_calls": [tool_call.model_dump(mode='json', exclude_none=True) for tool_call in message.tool_calls]
+        })
+
+        for tool_call, error in rejected_tool_calls:
+            contentMessages.append({
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "content": error
+            })
+        for tool_call, tool_invocation_result, duration in invoke_tool_calls(ctx, tool_calls, deadline):
+            tool_metrics = dict(name=tool_call.function.name, id=tool_call.id, latency=round(duration, 4))
+            round_metrics['tool_calls'].append(tool_metrics)
+            ctx.record_tool_call(tool_metrics)
+            contentMessages.append({
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "content": str(tool_invocation_result)
+            })
+
+        # once the round budget or deadline is spent, withhold the tools so the LLM has to answer
+        if len(rounds) >= module.params['max_tool_rounds']:
+            module.warn(f"Tool round budget of {module.params['max_tool_rounds']} exhausted, requesting final response from LLM")
+            tools_for_round = None
+        elif deadline != None and time.monotonic() >= deadline:
+            module.warn(f"Tool deadline of {module.params['tool_deadline']} seconds exceeded, requesting final response from LLM")
+            tools_for_round = None
+
+    chat_result = dict(
+        original_messages=original_messages,
+        response=completion.choices[0].message.content,
+        metrics=metrics,
+        rounds=rounds,
+        usage=usage,
+        elapsed=round(time.monotonic() - start_time, 4)
+    )
+    if prompt_tokens != None:
+        chat_result['prompt_tokens'] = prompt_tokens
+    if response_schema != None:
+        chat_result['parsed'] = parsed
+        chat_result['schema_retries'] = schema_retries
+
+    if ctx.semantic_cache:
+        chat_result['semantic_cache'] = dict(hit=False, similarity=None if similarity == None else round(similarity, 4))
+        if semantic_entry != None and chat_result['response'] != None:
+            index, scope, vector, key = semantic_entry
+            ctx.cache.put(key, dict(response=chat_result['response'], parsed=parsed))
+            index.add(scope, key, vector)
+
+    if ctx.session != None:
+        turn = contentMessages[len(systemMessages) + len(history):]
+        turn.append({"role": "assistant", "content": chat_result['response']})
+        ctx.session.add_turn(turn)
+    return chat_result
+
+def run_batch(ctx, system_prompt, tools_by_name, tools_list_for_openai):
+    import openai
+
+    module = ctx.module
+    prompts = module.params['prompts']
+
+    def run_prompt(prompt):
+        item = dict(prompt=prompt, response=None, failed=False)
+        try:
+            chat_result = run_chat(ctx, system_prompt, prompt, tools_by_name, tools_list_for_openai)
+            del chat_result['original_messages']
+            item.update(chat_result)
+        except openai.APIConnectionError as e:
+            item['failed'] = True
+            item['msg'] = f"Unable to connect to endpoint: {endpoint_description(module)}"
+        except openai.APIStatusError as e:
+            item['failed'] = True
+            item['msg'] = f"Request to endpoint failed with status {e.status_code}: {e.message}"
+        except SchemaValidationError as e:
+            item['failed'] = True
+            item['msg'] = str(e)
+            item['response'] = e.response
+        except Exception as e:
+            item['failed'] = True
+            item['msg'] = str(e)
+        return item
+
+    # executor.map preserves input ordering regardless of completion order
+    with ThreadPoolExecutor(max_workers=max(1, module.params['batch_concurrency'])) as executor:
+        return list(executor.map(run_prompt, prompts))
+
+def collect_metrics(ctx, start_time, failed=0):
+    """ Consolidated telemetry across every chat in this module run, including chats that failed, see module_utils/openai_metrics """
+    module = ctx.module
+    metrics = new_metrics('openai-chat', module.params['model_name'], endpoint_description(module))
+    # completions served from the cache cost no time or tokens on the endpoint and are not recorded
+    for llm in ctx.completions:
+        metrics['llm_calls'] += 1
+        metrics['llm_latency'] += llm['latency']
+        metrics['queue_wait'] += llm['queue_wait']
+        if llm['usage'] != None:
+            add_usage(metrics, llm['usage'].get('prompt_tokens'), llm['usage'].get('completion_tokens'), llm['usage'].get('total_tokens'))
+    for tool_call in ctx.tool_calls:
+        metrics['tool_calls'] += 1
+        metrics['tool_latency'] += tool_call['latency']
+
+    routing = ctx.endpoints.stats()
+    metrics['retries'] = routing['retries']
+    metrics['hedged_requests'] = routing['hedged_requests']
+    metrics['cache_hits'] = ctx.cache_hits
+    metrics['cache_misses'] = ctx.cache_misses
+    metrics['failed'] = failed
+    return finish_metrics(metrics, round(time.monotonic() - start_time, 4))
+
+def endpoint_description(module):
+    return ", ".join([module.params['endpoint_url']] + (module.params['endpoint_urls'] or []))
+
+def build_rate_limiters(module):
+    """ Shared rate limiter for each endpoint with a matching rate_limits entry """
+    urls = [module.params['endpoint_url']] + (module.params['endpoint_urls'] or [])
+    limiters = {}
+    for url in urls:
+        for limit in module.params['rate_limits'] or []:
+            if (limit['requests_per_second'] or 1) <= 0 or (limit['tokens_per_minute'] or 1) <= 0:
+                module.fail_json(msg="rate_limits requests_per_second and tokens_per_minute must be positive")
+            if limit['endpoint_url'] not in (None, url) or limit['model_name'] not in (None, module.params['model_name']):
+                continue
+            if limit['requests_per_second'] != None or limit['tokens_per_minute'] != None:
+                limiters[url] = RateLimiter(module.params['rate_limit_dir'], url, module.params['model_name'],
+                                            limit['requests_per_second'], limit['tokens_per_minute'])
+            break
+    return limiters
+
+def build_endpoint_pool(module, cert, tls_verify, proxy_socket=None):
+    import httpx
+    from openai import OpenAI
+
+    urls = [module.params['endpoint_url']] + (module.params['endpoint_urls'] or [])
+    weights = module.params['endpoint_weights'] or []
+    if len(weights) > len(urls):
+        module.fail_json(msg=f"endpoint_weights has {len(weights)} entries but only {len(urls)} endpoints are configured")
+
+    endpoints = []
+    for index, url in enumerate(urls):
+        # connections are owned by the proxy daemon when one is in use
+        if proxy_socket != None:
+            http_client = httpx.Client(transport=create_proxy_transport(proxy_socket, cert=cert, verify=tls_verify))
+        else:
+            http_client = httpx.Client(cert=cert, verify=tls_verify)
+
+        # retries are handled by the pool so that they can move to another endpoint
+        openai_client = OpenAI(
+            base_url = url,
+            api_key = module.params['api_key'],
+            timeout = httpx.Timeout(timeout=module.params['timeout']),
+            http_client=http_client,
+            max_retries=0
+        )
+        endpoints.append(Endpoint(url, openai_client, weights[index] if index < len(weights) else 1))
+
+    return EndpointPool(
+        endpoints,
+        routing=module.params['routing'],
+        max_retries=module.params['max_retries'],
+        backoff_base=module.params['retry_backoff'],
+        backoff_max=module.params['retry_backoff_max'],
+        hedge_after=module.params['hedge_after'],
+        eject_after=module.params['eject_after'],
+        eject_seconds=module.params['eject_seconds']
+    )
 
 def run_module():
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         endpoint_url=dict(type='str', required=True),
+        endpoint_urls=dict(type='list', elements='str', required=False, default=None),
+        endpoint_weights=dict(type='list', elements='int', required=False, default=None),
+        routing=dict(type='str', required=False, default='weighted', choices=['weighted', 'least_outstanding']),
+        max_retries=dict(type='int', required=False, default=2),
+        retry_backoff=dict(type='float', required=False, default=0.5),
+        retry_backoff_max=dict(type='float', required=False, default=30.0),
+        hedge_after=dict(type='float', required=False, default=None),
+        eject_after=dict(type='int', required=False, default=3),
+        eject_seconds=dict(type='int', required=False, default=30),
+        proxy_socket=dict(type='path', required=False, default=None),
+        proxy_idle_timeout=dict(type='int', required=False, default=300),
+        rate_limits=dict(type='list', elements='dict', required=False, default=None, options=dict(
+            endpoint_url=dict(type='str', required=False, default=None),
+            model_name=dict(type='str', required=False, default=None),
+            requests_per_second=dict(type='float', required=False, default=None),
+            tokens_per_minute=dict(type='int', required=False, default=None)
+        )),
+        rate_limit_dir=dict(type='path', required=False, default='~/.ansible/tmp/openai_ratelimit'),
         model_name=dict(type='str', required=True),
-        user_content=dict(type='str', required=True),
+        user_content=dict(type='str', required=False, default=None),
+        prompts=dict(type='list', elements='str', required=False, default=None),
+        batch_concurrency=dict(type='int', required=False, default=4),
         system_content=dict(type='str', required=False, default=None),
+        response_schema=dict(type='dict', required=False, default=None),
+        schema_retries=dict(type='int', required=False, default=2),
+        max_input_tokens=dict(type='int', required=False, default=None),
+        trim_strategy=dict(type='str', required=False, default='head_tail', choices=['head', 'tail', 'head_tail']),
+        dedupe_log_lines=dict(type='bool', required=False, default=False),
         api_key=dict(type='str', required=False, default='api_key'),
         timeout=dict(type='int', required=False, default=30),
         tls_insecure=dict(type='bool', required=False, default=False),
@@ -146,7 +1279,28 @@ def run_module():
         frequency_penalty=dict(type='int', required=False, default=0),
         presence_penalty=dict(type='int', required=False, default=0),
         tool_modules=dict(type='str', required=False, default=None),
-        log_messages=dict(type='bool', required=False, default=False)
+        tool_path=dict(type='list', elements='path', required=False, default=None),
+        tool_manifest=dict(type='path', required=False, default='~/.ansible/tmp/openai_tool_manifest.json'),
+        tool_cache_dir=dict(type='path', required=False, default=None),
+        tool_cache_max_size_mb=dict(type='int', required=False, default=50),
+        tool_workers=dict(type='int', required=False, default=4),
+        tool_timeout=dict(type='int', required=False, default=60),
+        max_tool_rounds=dict(type='int', required=False, default=5),
+        tool_deadline=dict(type='int', required=False, default=None),
+        log_messages=dict(type='bool', required=False, default=False),
+        stream=dict(type='bool', required=False, default=False),
+        cache_dir=dict(type='str', required=False, default=None),
+        cache_ttl=dict(type='int', required=False, default=86400),
+        cache_max_size_mb=dict(type='int', required=False, default=100),
+        semantic_cache=dict(type='bool', required=False, default=False),
+        semantic_cache_threshold=dict(type='float', required=False, default=0.95),
+        semantic_cache_embedding=dict(type='str', required=False, default='hashing', choices=['hashing', 'endpoint']),
+        semantic_cache_embedding_model=dict(type='str', required=False, default=None),
+        semantic_cache_max_entries=dict(type='int', required=False, default=10000),
+        session_id=dict(type='str', required=False, default=None),
+        session_dir=dict(type='path', required=False, default='~/.ansible/tmp/openai_sessions'),
+        session_max_turns=dict(type='int', required=False, default=20),
+        session_reset=dict(type='bool', required=False, default=False)
     )
     
     # seed the result dict in the object
@@ -166,6 +1320,9 @@ def run_module():
     # supports check mode
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[('user_content', 'prompts'), ('session_id', 'prompts'), ('session_id', 'semantic_cache')],
+        required_one_of=[('user_content', 'prompts')],
+        required_if=[('semantic_cache', True, ('cache_dir',))],
         supports_check_mode=True
     )
 
@@ -175,6 +1332,11 @@ def run_module():
     if module.check_mode:
         module.exit_json(**result)
 
+    # deferred until after argument validation and check mode, which do not need the client libraries
+    import openai
+
+    start_time = time.monotonic()
+
     # Apply TLS security to API Call based on input parameters
     cert = None
     if module.params['tls_client_cert'] != None or module.params['tls_client_key'] != None or module.params['tls_client_passwd'] != None:
@@ -187,106 +1349,130 @@ def run_module():
         system_prompt = ""
 
     # Process tools modules list provided as input
-    tools_list_for_openai = openai.NOT_GIVEN
+    tools_list_for_openai = None
+    tools_by_name = {}
+    tool_registry = None
     if module.params['tool_modules'] != None:
         tool_modules_filenames = module.params['tool_modules'].split(',')
 
-        tool_modules_list = []
         tools_list_for_openai = []
         module.warn(f"Including Tool Calls in LLM Invocation: {module.params['tool_modules']}")
 
-        for tool_module_filename in tool_modules_filenames:
-            file_path = f"/Users/lroland/Projects/github.com/openai-ansible-module/library/{tool_module_filename}"
-            dynamic_tool_module = dynamically_load_python_module(file_path)
+        # tool implementations are only imported once the LLM actually calls them
+        tool_registry = ToolRegistry(tool_search_path(module), module.params['tool_manifest'],
+                                     cache_dir=module.params['tool_cache_dir'], cache_max_size_mb=module.params['tool_cache_max_size_mb'])
+        try:
+            tools = [tool_registry.load(tool_module_filename) for tool_module_filename in dict.fromkeys(tool_modules_filenames)]
 
-            tool_modules_list.append(dynamic_tool_module)
-            tools_list_for_openai.append(dynamic_tool_module.tool_definition)
-            system_prompt += " " + dynamic_tool_module.tool_prompt_addendum
+            # a stable order keeps the system prompt and tool definitions byte identical between
+            # calls, so the server can reuse its prefix cache however the tools were listed
+            for tool in sorted(tools, key=lambda tool: tool.tool_name):
+                tools_by_name[tool.tool_name] = tool
+                tools_list_for_openai.append(tool.tool_definition)
+                system_prompt += " " + tool.tool_prompt_addendum
+            tool_registry.save_manifest()
+        except (ToolLoadError, OSError, SyntaxError) as e:
+            module.fail_json(msg=f"Unable to load tool modules: {e}", **result)
     system_prompt = system_prompt.strip()
 
-    # Create OpenAI chat message input
-    contentMessages = []
-    userContentMessage = {"role": "user", "content": module.params['user_content']}
-    if system_prompt == None or len(system_prompt) == 0:
-        contentMessages = [ userContentMessage ]
-    else:
-        contentMessages = [ {"role": "system", "content": system_prompt}, userContentMessage ]
-    
-    # store requested chat messages
-    result['original_messages'] = contentMessages
+    # Compile the response schema up front so an invalid schema fails before any LLM call
+    if module.params['response_schema'] != None:
+        try:
+            get_validator(module.params['response_schema'])
+        except ImportError:
+            module.fail_json(msg=missing_required_lib('jsonschema'), **result)
+        except Exception as e:
+            module.fail_json(msg=f"Invalid response_schema: {e}", **result)
+        system_prompt = (system_prompt + " " + schema_instructions(module.params['response_schema'])).strip()
 
-    try:
-        openai_client = OpenAI(
-            base_url = module.params['endpoint_url'],
-            api_key = module.params['api_key'],
-            timeout = httpx.Timeout(timeout=module.params['timeout']),
-            http_client=httpx.Client(cert=cert, verify=tls_verify)
-        )
+    # Optional shared proxy daemon, falling back to direct connections if it cannot be started
+    proxy_socket = None
+    if module.params['proxy_socket'] != None:
+        try:
+            proxy_socket = ensure_proxy_daemon(module.params['proxy_socket'], idle_timeout=module.params['proxy_idle_timeout'])
+        except OSError as e:
+            module.warn(f"Proxy daemon unavailable, connecting to endpoints directly: {e}")
 
-        if module.params['log_messages']:
-            module.warn(f"Input Messages to LLM: {contentMessages}")
-
-        completion = openai_client.chat.completions.create(
-            model=module.params['model_name'],
-            messages=contentMessages,
-            temperature=module.params['temperature'],
-            max_tokens=module.params['max_tokens'],
-            top_p=module.params['top_p'],
-            frequency_penalty=module.params['frequency_penalty'],
-            presence_penalty=module.params['presence_penalty'],
-            tools=tools_list_for_openai
-        )
+    endpoints = build_endpoint_pool(module, cert, tls_verify, proxy_socket)
 
-        if completion.choices[0].message.tool_calls != None:
-            num_tool_calls = len(completion.choices[0].message.tool_calls)
-            tool_counter = 0
+    # Optional persistent response cache
+    cache = None
+    if module.params['cache_dir'] != None:
+        cache = ResponseCache(module.params['cache_dir'], ttl=module.params['cache_ttl'], max_size_mb=module.params['cache_max_size_mb'])
 
-            for tool_call in completion.choices[0].message.tool_calls:
-                tool_counter += 1
-                tool_name = tool_call.function.name
-                args = json.loads(tool_call.function.arguments)
-                module.warn(f"Tool Invocation ({tool_counter} of {num_tool_calls}) Requested by LLM: {tool_name} with args: {args}")
-
-                # Invoke the appropriate tool
-                invoked_flag = False
-                tool_invocation_result = None
-                for tool_module in tool_modules_list:
-                    if tool_module.tool_name == tool_name:
-                        invoked_flag = True
-                        tool_invocation_result = tool_module.tool_function(module, args)
-                        break
-                if not invoked_flag:
-                    module.fail_json(msg=f"Unable to find tool module corresponding to tool request: {tool_name}", **result)
-
-                #contentMessages.append(completion.choices[0].message)
-
-                contentMessages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": str(tool_invocation_result)
-                })
-
-            if module.params['log_messages']:
-                module.warn(f"Input Messages to LLM: {contentMessages}")
-
-            completion = openai_client.chat.completions.create(
-                model=module.params['model_name'],
-                messages=contentMessages,
-                temperature=module.params['temperature'],
-                max_tokens=module.params['max_tokens'],
-                top_p=module.params['top_p'],
-                frequency_penalty=module.params['frequency_penalty'],
-                presence_penalty=module.params['presence_penalty'],
-                tools=tools_list_for_openai
-            )
+    # Optional conversation history, locked for the rest of the task
+    session = None
+    if module.params['session_id'] != None:
+        if module.params['session_max_turns'] < 1:
+            module.fail_json(msg="session_max_turns must be at least 1", **result)
+        session = ConversationSession(module.params['session_dir'], module.params['session_id'], module.params['session_max_turns'])
+        session.open(reset=module.params['session_reset'])
+
+    # answers that depend on live tool output for a specific host must not be reused for another
+    semantic_cache = module.params['semantic_cache']
+    if semantic_cache and tools_list_for_openai != None:
+        module.warn("semantic_cache is skipped when tool_modules is provided")
+        semantic_cache = False
 
-        result['response'] = completion.choices[0].message.content
+    ctx = ChatContext(module, endpoints, cache, semantic_cache, build_rate_limiters(module), session)
+
+    if module.params['prompts'] != None:
+        try:
+            result['responses'] = run_batch(ctx, system_prompt, tools_by_name, tools_list_for_openai)
+        finally:
+            if tool_registry != None:
+                tool_registry.close()
+        result['failed_prompts'] = len([item for item in result['responses'] if item['failed']])
+        result['routing'] = endpoints.stats()
+        result['openai_metrics'] = collect_metrics(ctx, start_time, result['failed_prompts'])
+        if cache != None:
+            result['cache_hits'] = ctx.cache_hits
+        if tool_registry != None:
+            result['tool_cache_hits'] = tool_registry.context.cache_hits
+
+        # Assuming that at least one successful API invocation = a change
+        result['changed'] = result['failed_prompts'] < len(result['responses']) and (cache == None or ctx.cache_misses > 0)
+        module.exit_json(**result)
+
+    try:
+        result.update(run_chat(ctx, system_prompt, module.params['user_content'], tools_by_name, tools_list_for_openai))
+        if session != None:
+            session.save()
+            result['session'] = session.stats()
 
     except openai.APIConnectionError as e:
-        module.fail_json(msg=f"Unable to connect to endpoint: {module.params['endpoint_url']}", **result)
+        result['routing'] = endpoints.stats()
+        result['openai_metrics'] = collect_metrics(ctx, start_time, failed=1)
+        module.fail_json(msg=f"Unable to connect to endpoint: {endpoint_description(module)}", **result)
+    except openai.APIStatusError as e:
+        result['routing'] = endpoints.stats()
+        result['openai_metrics'] = collect_metrics(ctx, start_time, failed=1)
+        module.fail_json(msg=f"Request to endpoint failed with status {e.status_code}: {e.message}", **result)
+    except SchemaValidationError as e:
+        result['response'] = e.response
+        result['openai_metrics'] = collect_metrics(ctx, start_time, failed=1)
+        module.fail_json(msg=str(e), **result)
+    except (ToolLoadError, PromptTooLargeError) as e:
+        result['openai_metrics'] = collect_metrics(ctx, start_time, failed=1)
+        module.fail_json(msg=str(e), **result)
+    finally:
+        # release pooled tool backend connections and the session lock
+        if tool_registry != None:
+            tool_registry.close()
+        if session != None:
+            session.close()
         
-    # Assuming that successful API invocation = a change
+    result['routing'] = endpoints.stats()
+    result['openai_metrics'] = collect_metrics(ctx, start_time)
+    if tool_registry != None:
+        result['tool_cache_hits'] = tool_registry.context.cache_hits
+
+    # Assuming that successful API invocation = a change, responses served entirely
+    # from the cache did not touch the endpoint
     result['changed'] = True
+    if cache != None:
+        result['cache_hits'] = ctx.cache_hits
+        result['changed'] = ctx.cache_misses > 0
 
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
@@ -78,6 +78,59 @@ options:
         description: Presence Penalty
         required: false
         type: int
+    strategy:
+        description: Summarization strategy.  stuff sends every document in a single prompt, map_reduce summarizes chunks concurrently and then combines the summaries, refine walks the chunks sequentially refining a running summary.  map_reduce and refine stream text files from disk so memory stays bounded regardless of directory size.
+        required: false
+        type: str
+        choices: [ stuff, map_reduce, refine ]
+    chunk_size:
+        description: Maximum number of tokens per chunk for the map_reduce and refine strategies
+        required: false
+        type: int
+    chunk_overlap:
+        description: Number of tokens shared between consecutive chunks
+        required: false
+        type: int
+    max_concurrency:
+        description: Maximum number of concurrent LLM calls during the map phase of the map_reduce strategy
+        required: false
+        type: int
+    incremental_dir:
+        description: Directory for the incremental summary index.  When provided with the map_reduce strategy, chunk summaries are stored by content hash so later runs only summarize new or changed chunks before re-reducing.
+        required: false
+        type: str
+    incremental_max_size_mb:
+        description: Maximum size of the incremental summary index in megabytes before least recently used entries are evicted
+        required: false
+        type: int
+    compress_logs:
+        description: Condense each file into log templates before summarizing.  Lines are clustered online into templates with variable fields such as timestamps, addresses and counters replaced by <*>, and each template is sent once with its occurrence count, the line it first appeared on and a few sample values.  Repetitive logs shrink considerably while rare lines, which are usually the interesting ones, are kept verbatim.
+        required: false
+        type: bool
+    log_similarity_threshold:
+        description: Fraction of tokens a line must share with an existing template to be merged into it when compress_logs is enabled.  Lower values produce fewer, more general templates.
+        required: false
+        type: float
+    log_tree_depth:
+        description: Depth of the template parse tree when compress_logs is enabled.  Lines are only compared with templates that share their token count and first log_tree_depth - 2 tokens.
+        required: false
+        type: int
+    log_template_samples:
+        description: Number of sample variable values kept for each template when compress_logs is enabled
+        required: false
+        type: int
+    cache_dir:
+        description: Directory for the persistent response cache.  Caching is disabled when not provided.
+        required: false
+        type: str
+    cache_ttl:
+        description: Number of seconds a cached response remains valid
+        required: false
+        type: int
+    cache_max_size_mb:
+        description: Maximum size of the response cache in megabytes before least recently used entries are evicted
+        required: false
+        type: int
 # Specify this value according to your collection
 # in format of namespace.collection.doc_fragment_name
 # extends_documentation_fragment:
@@ -95,18 +148,189 @@ EXAMPLES = r'''
       model_name: 'models/merlinite-7b-lab-Q4_K_M.gguf'
       user_content: 'Hello AI Platform!  How are you today?'
 
+# Summarize a log directory that is larger than the context window
+  - name: Run OpenAI Summarize Module
+    openai-summarize:
+      endpoint_url: 'http://127.0.0.1:8000/v1'
+      model_name: 'models/merlinite-7b-lab-Q4_K_M.gguf'
+      dir_path: '/var/log/pods'
+      file_regex: '**/*.log'
+      strategy: map_reduce
+      chunk_size: 3000
+      max_concurrency: 8
+
+# Condense repetitive logs into templates before summarizing
+  - name: Run OpenAI Summarize Module
+    openai-summarize:
+      endpoint_url: 'http://127.0.0.1:8000/v1'
+      model_name: 'models/merlinite-7b-lab-Q4_K_M.gguf'
+      dir_path: '/var/log/pods'
+      file_regex: '**/*.log'
+      strategy: map_reduce
+      compress_logs: true
+
 '''
 
 RETURN = r'''
 # These are examples of possible return values, and in general should use other names for return values.
+openai_metrics:
+    description: Consolidated telemetry for the whole module run, with the same keys as the openai-chat module, aggregated across a play by the openai_telemetry callback plugin.  cache_hits and cache_misses include the chunks reused from and recomputed for the incremental index.
+    type: dict
+    returned: always, except in check mode and when argument validation fails
+log_compression:
+    description: Effect of compress_logs on the corpus, with the number of lines and templates, the bytes read and sent and the resulting compression ratio.  Not returned when the summary was served from the cache.
+    type: dict
+    returned: when compress_logs is enabled
+    sample: {"lines": 50, "templates": 20, "input_bytes": 10283, "output_bytes": 5725, "ratio": 1.8}
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from langchain.chains.summarize import load_summarize_chain
-from langchain_openai import ChatOpenAI
-from langchain_community.document_loaders import DirectoryLoader
-import openai
-import httpx
+from ansible.module_utils.openai_cache import ResponseCache, canonical_hash
+from ansible.module_utils.openai_tokens import count_tokens
+from ansible.module_utils.openai_documents import IngestStats, iter_files, iter_lines, iter_chunks, hash_file, peak_rss_mb
+from ansible.module_utils.openai_logtemplates import compress_lines
+from ansible.module_utils.openai_metrics import new_metrics, add_usage, finish_metrics
+import itertools
+import time
+
+MAP_PROMPT = """Write a concise summary of the following:
+
+
+"{text}"
+
+
+CONCISE SUMMARY:"""
+
+COMBINE_PROMPT = """Write a concise summary of the following summaries, preserving any errors or anomalies they describe:
+
+
+"{text}"
+
+
+CONCISE SUMMARY:"""
+
+REFINE_PROMPT = """Your job is to produce a final summary.
+We have provided an existing summary up to a certain point: {existing_answer}
+We have the opportunity to refine the existing summary (only if needed) with some more context below.
+------------
+{text}
+------------
+Given the new context, refine the original summary.
+If the context isn't useful, return the original summary."""
+
+def summary_index_key(module, prompt):
+    return canonical_hash(dict(
+        endpoint_url=module.params['endpoint_url'],
+        model=module.params['model_name'],
+        temperature=module.params['temperature'],
+        max_tokens=module.params['max_tokens'],
+        top_p=module.params['top_p'],
+        prompt=prompt
+    ))
+
+def record_llm_calls(metrics, responses, latency):
+    metrics['llm_calls'] += len(responses)
+    metrics['llm_latency'] += latency
+    for response in responses:
+        usage = getattr(response, 'usage_metadata', None) or {}
+        add_usage(metrics, usage.get('input_tokens'), usage.get('output_tokens'), usage.get('total_tokens'))
+
+def summarize_batch(module, llm, prompts, stats, index=None, count_chunks=False):
+    summaries = [None] * len(prompts)
+    keys = [None] * len(prompts)
+    missing = []
+    for i, prompt in enumerate(prompts):
+        if index != None:
+            keys[i] = summary_index_key(module, prompt)
+            summaries[i] = index.get(keys[i])
+        if summaries[i] == None:
+            missing.append(i)
+
+    if len(missing) > 0:
+        start_time = time.monotonic()
+        responses = llm.batch([prompts[i] for i in missing], config={"max_concurrency": module.params['max_concurrency']})
+        record_llm_calls(stats, responses, time.monotonic() - start_time)
+        for i, response in zip(missing, responses):
+            summaries[i] = response.content
+            if index != None:
+                index.put(keys[i], summaries[i], evict=False)
+        if index != None:
+            index.evict()
+
+    if count_chunks:
+        stats['chunks_reused'] += len(prompts) - len(missing)
+        stats['chunks_recomputed'] += len(missing)
+        if index != None:
+            # every chunk looked up in the incremental index counts towards the cache telemetry
+            stats['cache_hits'] += len(prompts) - len(missing)
+            stats['cache_misses'] += len(missing)
+    return summaries
+
+def collapse_summaries(module, llm, summaries, stats, index=None):
+    """ Combine groups of summaries until they fit within a single chunk """
+    model_name = module.params['model_name']
+    chunk_size = module.params['chunk_size']
+
+    while len(summaries) > 1 and count_tokens("\n\n".join(summaries), model_name) > chunk_size:
+        groups = []
+        group = []
+        group_tokens = 0
+        for summary in summaries:
+            summary_tokens = count_tokens(summary, model_name)
+            if len(group) > 0 and group_tokens + summary_tokens > chunk_size:
+                groups.append(group)
+                group = []
+                group_tokens = 0
+            group.append(summary)
+            group_tokens += summary_tokens
+        groups.append(group)
+
+        # no progress is possible once every group holds a single summary
+        if len(groups) == len(summaries):
+            break
+        summaries = summarize_batch(module, llm, [COMBINE_PROMPT.format(text="\n\n".join(group)) for group in groups], stats, index)
+
+    return summaries
+
+def summarize_map_reduce(module, llm, chunks, stats, index=None):
+    # map - chunks are pulled from the stream a window at a time and summarized concurrently,
+    # collapsing as we go so that only the running summaries are held in memory.  With an
+    # incremental index every summary is keyed on its prompt, so unchanged chunks and any
+    # collapse or reduce step over unchanged summaries are served without an LLM call.
+    window_size = max(1, module.params['max_concurrency']) * 4
+    summaries = []
+    while True:
+        window = list(itertools.islice(chunks, window_size))
+        if len(window) == 0:
+            break
+        summaries.extend(summarize_batch(module, llm, [MAP_PROMPT.format(text=text) for source, text in window], stats, index, count_chunks=True))
+        summaries = collapse_summaries(module, llm, summaries, stats, index)
+
+    # reduce
+    if len(summaries) == 0:
+        return ""
+    if len(summaries) == 1:
+        return summaries[0]
+    return summarize_batch(module, llm, [COMBINE_PROMPT.format(text="\n\n".join(summaries))], stats, index)[0]
+
+def summarize_refine(module, llm, chunks, stats):
+    # each step depends on the previous summary so refine is inherently sequential
+    summary = ""
+    for source, text in chunks:
+        start_time = time.monotonic()
+        if stats['llm_calls'] == 0:
+            response = llm.invoke(MAP_PROMPT.format(text=text))
+        else:
+            response = llm.invoke(REFINE_PROMPT.format(existing_answer=summary, text=text))
+        record_llm_calls(stats, [response], time.monotonic() - start_time)
+        summary = response.content
+    return summary
+
+def log_compression_result(log_stats):
+    ratio = None
+    if log_stats['output_bytes'] > 0:
+        ratio = round(log_stats['input_bytes'] / log_stats['output_bytes'], 2)
+    return dict(log_stats, ratio=ratio)
 
 def run_module():
     # define available arguments/parameters a user can pass to the module
@@ -123,7 +347,20 @@ def run_module():
         tls_client_passwd=dict(type='str', required=False, default=None, no_log=True),
         temperature=dict(type='float', required=False, default=0.1),
         max_tokens=dict(type='int', required=False, default=100),
-        top_p=dict(type='int', required=False, default=1)
+        top_p=dict(type='int', required=False, default=1),
+        strategy=dict(type='str', required=False, default='stuff', choices=['stuff', 'map_reduce', 'refine']),
+        chunk_size=dict(type='int', required=False, default=2000),
+        chunk_overlap=dict(type='int', required=False, default=100),
+        max_concurrency=dict(type='int', required=False, default=4),
+        incremental_dir=dict(type='str', required=False, default=None),
+        incremental_max_size_mb=dict(type='int', required=False, default=500),
+        compress_logs=dict(type='bool', required=False, default=False),
+        log_similarity_threshold=dict(type='float', required=False, default=0.5),
+        log_tree_depth=dict(type='int', required=False, default=4),
+        log_template_samples=dict(type='int', required=False, default=3),
+        cache_dir=dict(type='str', required=False, default=None),
+        cache_ttl=dict(type='int', required=False, default=86400),
+        cache_max_size_mb=dict(type='int', required=False, default=100)
     )
     
     # seed the result dict in the object
@@ -152,12 +389,78 @@ def run_module():
     if module.check_mode:
         module.exit_json(**result)
 
-    # Load content
-    loader = DirectoryLoader(module.params['dir_path'], module.params['file_regex'])
-    docs = loader.load()
+    if module.params['incremental_dir'] != None and module.params['strategy'] != 'map_reduce':
+        module.fail_json(msg="incremental_dir is only supported with the map_reduce strategy", **result)
+    if module.params['chunk_size'] <= 0:
+        module.fail_json(msg="chunk_size must be a positive number of tokens", **result)
+    if module.params['log_similarity_threshold'] < 0 or module.params['log_similarity_threshold'] > 1:
+        module.fail_json(msg="log_similarity_threshold must be between 0 and 1", **result)
+    if module.params['log_tree_depth'] < 3:
+        module.fail_json(msg="log_tree_depth must be at least 3", **result)
+
+    start_time = time.monotonic()
+    metrics = new_metrics('openai-summarize', module.params['model_name'], module.params['endpoint_url'])
+
+    # deferred until after argument validation and check mode, which do not need the client libraries
+    import openai
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+    # Load content - the chunked strategies stream files lazily instead of loading the whole corpus
+    docs = None
+    file_paths = None
+    if module.params['strategy'] == 'stuff':
+        # pulls in unstructured, so only imported for the strategy that needs it
+        from langchain_community.document_loaders import DirectoryLoader
 
-    # store requested chat messages
-    result['num_files_loaded'] = len(docs)
+        loader = DirectoryLoader(module.params['dir_path'], module.params['file_regex'])
+        docs = loader.load()
+        result['num_files_loaded'] = len(docs)
+    else:
+        file_paths = list(iter_files(module.params['dir_path'], module.params['file_regex']))
+        result['num_files_loaded'] = len(file_paths)
+
+    # Condense repetitive log lines into templates, per file so that each keeps its own line numbers
+    log_stats = None
+    read_lines = iter_lines
+    if module.params['compress_logs']:
+        log_stats = dict(lines=0, templates=0, input_bytes=0, output_bytes=0)
+        compress_options = dict(depth=module.params['log_tree_depth'],
+                                similarity_threshold=module.params['log_similarity_threshold'],
+                                max_samples=module.params['log_template_samples'],
+                                stats=log_stats)
+        if docs != None:
+            for doc in docs:
+                doc.page_content = "".join(compress_lines(doc.page_content.splitlines(keepends=True), **compress_options))
+            result['log_compression'] = log_compression_result(log_stats)
+        else:
+            read_lines = lambda file_path, stats: compress_lines(iter_lines(file_path, stats), **compress_options)
+
+    # Serve the summary from the cache when the same documents have already been summarized
+    cache = None
+    cache_key = None
+    if module.params['cache_dir'] != None:
+        cache = ResponseCache(module.params['cache_dir'], ttl=module.params['cache_ttl'], max_size_mb=module.params['cache_max_size_mb'])
+        cache_key = canonical_hash(dict(
+            endpoint_url=module.params['endpoint_url'],
+            model=module.params['model_name'],
+            temperature=module.params['temperature'],
+            max_tokens=module.params['max_tokens'],
+            top_p=module.params['top_p'],
+            strategy=module.params['strategy'],
+            chunk_size=module.params['chunk_size'],
+            chunk_overlap=module.params['chunk_overlap'],
+            compress_logs=[module.params['log_similarity_threshold'], module.params['log_tree_depth'], module.params['log_template_samples']] if module.params['compress_logs'] else False,
+            documents=[[doc.metadata.get('source'), doc.page_content] for doc in docs] if docs != None else [[file_path, hash_file(file_path)] for file_path in file_paths]
+        ))
+        cached_response = cache.get(cache_key)
+        result['cache_hit'] = cached_response != None
+        if cached_response != None:
+            result['response'] = cached_response
+            metrics['cache_hits'] = 1
+            result['openai_metrics'] = finish_metrics(metrics, round(time.monotonic() - start_time, 4))
+            module.exit_json(**result)
+        metrics['cache_misses'] = 1
 
     # Apply TLS security to API Call based on input parameters
     cert = None
@@ -177,17 +480,59 @@ def run_module():
             top_p=module.params['top_p']
         )
 
-        chain = load_summarize_chain(openai_client, chain_type="stuff")
+        result['strategy'] = module.params['strategy']
+        if module.params['strategy'] == 'stuff':
+            from langchain.chains.summarize import load_summarize_chain
+            from langchain_community.callbacks import get_openai_callback
+
+            chain = load_summarize_chain(openai_client, chain_type="stuff")
+
+            llm_start_time = time.monotonic()
+            with get_openai_callback() as usage_callback:
+                langchain_results = chain.invoke(docs)
+            metrics['llm_calls'] += usage_callback.successful_requests
+            metrics['llm_latency'] += time.monotonic() - llm_start_time
+            add_usage(metrics, usage_callback.prompt_tokens, usage_callback.completion_tokens, usage_callback.total_tokens)
+
+            result['response'] = langchain_results["output_text"]
+        else:
+            model_name = module.params['model_name']
+            ingest_stats = IngestStats()
+            chunks = iter_chunks(file_paths, module.params['chunk_size'], module.params['chunk_overlap'],
+                                 lambda text: count_tokens(text, model_name), ingest_stats, read_lines)
 
-        langchain_results = chain.invoke(docs)
+            stats = dict(metrics, chunks_reused=0, chunks_recomputed=0)
+            if module.params['strategy'] == 'map_reduce':
+                index = None
+                if module.params['incremental_dir'] != None:
+                    index = ResponseCache(module.params['incremental_dir'], ttl=None, max_size_mb=module.params['incremental_max_size_mb'])
+                result['response'] = summarize_map_reduce(module, openai_client, chunks, stats, index)
+                if index != None:
+                    result['chunks_reused'] = stats['chunks_reused']
+                    result['chunks_recomputed'] = stats['chunks_recomputed']
+            else:
+                result['response'] = summarize_refine(module, openai_client, chunks, stats)
+            for key in metrics:
+                metrics[key] = stats[key]
+            result['llm_calls'] = stats['llm_calls']
+            result['num_chunks'] = ingest_stats.chunks
+            result['bytes_processed'] = ingest_stats.bytes
+            result['peak_rss_mb'] = peak_rss_mb()
+            if log_stats != None:
+                result['log_compression'] = log_compression_result(log_stats)
 
-        result['response'] = langchain_results["output_text"]
+        if cache != None:
+            cache.put(cache_key, result['response'])
 
     except openai.APIConnectionError as e:
+        metrics['failed'] = 1
+        result['openai_metrics'] = finish_metrics(metrics, round(time.monotonic() - start_time, 4))
         module.fail_json(msg=f"Unable to connect to endpoint: {module.params['endpoint_url']}", **result)
         
-    # Assuming that successful API invocation = a change
-    result['changed'] = True
+    # Assuming that successful API invocation = a change, summaries rebuilt entirely from
+    # the incremental index did not touch the endpoint
+    result['changed'] = metrics['llm_calls'] > 0
+    result['openai_metrics'] = finish_metrics(metrics, round(time.monotonic() - start_time, 4))
 
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
@@ -3,23 +3,71 @@ from elasticsearch import Elasticsearch
 
 tool_name = "count_log_entries"
 
-tool_prompt_addendum = f"Always use the {tool_name} tool to get the number of log entries that exist for a given machine name."
+tool_prompt_addendum = f"Always use the {tool_name} tool to get the number of log entries that exist for a given machine name.  When asked about several machines, pass them all in machine_names in a single call."
 
-def tool_function(ansible_module, args):
-    machine_name = args["machine_name"]
+log_index = "ocp-index"
 
-    elastic_client = Elasticsearch(
+tool_cache_ttl = 60
+
+def tool_normalize_args(args):
+    # machine names are case insensitive and order does not change the counts
+    machine_name = args.get("machine_name")
+    machine_names = args.get("machine_names")
+    if isinstance(machine_names, str):
+        machine_names = [machine_names]
+    return dict(
+        machine_name=None if machine_name is None else machine_name.strip().lower(),
+        machine_names=None if machine_names is None else sorted(set(name.strip().lower() for name in machine_names))
+    )
+
+def create_elastic_client():
+    return Elasticsearch(
         os.environ["ES_URL"],
         api_key=os.environ["ES_API_KEY"],
         verify_certs=False
     )
 
-    elastic_client.info()
+def count_entries(elastic_client, machine_name):
+    # counted by elasticsearch, no hits are returned
+    response = elastic_client.count(index=log_index, q=machine_name)
+    return response["count"]
+
+def count_entries_batch(elastic_client, machine_names):
+    # one round trip for every machine, each search returning only its total
+    searches = []
+    for machine_name in machine_names:
+        searches.append({"index": log_index})
+        searches.append({"size": 0, "track_total_hits": True, "query": {"query_string": {"query": machine_name}}})
+    response = elastic_client.msearch(searches=searches)
+
+    counts = {}
+    for machine_name, search_response in zip(machine_names, response["responses"]):
+        if "error" in search_response:
+            counts[machine_name] = -1
+        else:
+            counts[machine_name] = search_response["hits"]["total"]["value"]
+    return counts
+
+def tool_function(ansible_module, args, context=None):
+    machine_names = args.get("machine_names") or []
+    if isinstance(machine_names, str):
+        machine_names = [machine_names]
+    if args.get("machine_name"):
+        machine_names = [args["machine_name"]] + list(machine_names)
+    machine_names = list(dict.fromkeys(machine_names))
+
+    # reuse the pooled client across calls within the same module run
+    if context is None:
+        elastic_client = create_elastic_client()
+    else:
+        elastic_client = context.client("elasticsearch", create_elastic_client)
 
-    result_set = elastic_client.search(index="ocp-index", q=machine_name)
-    result = -1
-    if result_set is not None:
-        result = len(result_set)
+    if len(machine_names) == 0:
+        result = "No machine name was provided"
+    elif len(machine_names) == 1 and args.get("machine_names") is None:
+        result = count_entries(elastic_client, machine_names[0])
+    else:
+        result = count_entries_batch(elastic_client, machine_names)
 
     ansible_module.warn(f"Tool {tool_name} for arguments {args} == {result}")
 
@@ -30,13 +78,21 @@ tool_definition = {
     "type": "function",
     "function": {
         "name": tool_name,
-        "description": "Counts the number of log entries that exist for the specified machine name.",
+        "description": "Counts the number of log entries that exist for the specified machine name, or for each of several machine names.",
         "parameters": {
             "type": "object",
             "properties": {
-                "machine_name": {"type": "string"}
+                "machine_name": {
+                    "type": ["string", "null"],
+                    "description": "A single machine name"
+                },
+                "machine_names": {
+                    "type": ["array", "null"],
+                    "items": {"type": "string"},
+                    "description": "Several machine names, counted in one request"
+                }
             },
-            "required": ["machine_name"],
+            "required": ["machine_name", "machine_names"],
             "additionalProperties": False
         },
         "strict": True
@@ -4,11 +4,21 @@ tool_name = "get_weather"
 
 tool_prompt_addendum = f"Always use the {tool_name} tool to get the current temperature in fahrenheit for a given location or city based on its latitude and longitude."
 
-def tool_function(ansible_module, args):
+# current conditions are refreshed every 15 minutes
+tool_cache_ttl = 900
+
+def tool_normalize_args(args):
+    # two decimal places is roughly 1km, well within the resolution of the forecast grid
+    return dict(latitude=round(float(args["latitude"]), 2), longitude=round(float(args["longitude"]), 2))
+
+def tool_function(ansible_module, args, context=None):
     latitude = args["latitude"]
     longitude = args["longitude"]
 
-    response = requests.get(f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current=temperature_2m&hourly=temperature_2m&temperature_unit=fahrenheit&wind_speed_unit=mph&precipitation_unit=inch&forecast_days=1")
+    # reuse the pooled keep-alive session across calls within the same module run
+    session = requests if context is None else context.http_session()
+
+    response = session.get(f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current=temperature_2m&hourly=temperature_2m&temperature_unit=fahrenheit&wind_speed_unit=mph&precipitation_unit=inch&forecast_days=1")
     data = response.json()
     result = data['current']['temperature_2m']
 
@@ -0,0 +1,167 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# fraction of max_size_mb a full cache is trimmed down to
+EVICT_TO = 0.9
+
+def write_json_atomic(path, value, **dump_args):
+    """ Write value as JSON to a temporary file that is renamed into place, so that concurrent
+    readers never observe a partial file.  Returns the number of bytes written.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, **dump_args)
+        size = os.stat(tmp_path).st_size
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return size
+
+def canonical_hash(request):
+    """ Content address for a request - stable regardless of dict ordering """
+    payload = json.dumps(request, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """ Content addressed on-disk cache shared between Ansible forks.
+
+    Entries are written to a temporary file and atomically renamed into place so
+    concurrent readers never observe a partial entry.  The file modification time
+    doubles as the LRU recency marker and is refreshed on every hit.  Eviction is
+    serialized across processes using an advisory lock on the cache directory.
+
+    A running total of the entry sizes is kept in a small file so that writes only
+    walk the cache when it may be over budget.  Removals outside of eviction are not
+    subtracted, so the total can only overestimate and each walk resets it exactly.
+    """
+
+    def __init__(self, cache_dir, ttl=86400, max_size_mb=100):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.ttl = ttl
+        self.max_bytes = max_size_mb * 1024 * 1024
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _update_size(self, delta=0, total=None):
+        """ Add delta to the running total, or replace it with total.  Returns None while the total is unknown """
+        with open(os.path.join(self.cache_dir, ".size"), "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if total is None:
+                    f.seek(0)
+                    try:
+                        total = int(f.read()) + delta
+                    except ValueError:
+                        return None
+                f.seek(0)
+                f.truncate()
+                f.write(str(total))
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return total
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self.ttl is not None and self.ttl > 0 and time.time() - entry.get("created", 0) > self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        # refresh recency for LRU eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        return entry.get("value")
+
+    def put(self, key, value, evict=True):
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        try:
+            previous_size = os.stat(path).st_size
+        except OSError:
+            previous_size = 0
+
+        size = write_json_atomic(path, {"created": time.time(), "value": value}, default=str)
+
+        self._update_size(size - previous_size)
+
+        # callers writing many entries at once can defer eviction to a single pass
+        if evict:
+            self.evict()
+
+    def evict(self):
+        total = self._update_size()
+        if total is not None and total <= self.max_bytes:
+            return
+
+        lock_path = os.path.join(self.cache_dir, ".lock")
+        with open(lock_path, "a") as lock_file:
+            # another fork is already evicting so there's nothing for us to do
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+
+            try:
+                self._evict_locked()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _evict_locked(self):
+        entries = []
+        total_bytes = 0
+        for root, dirs, files in os.walk(self.cache_dir):
+            for filename in files:
+                if not filename.endswith(".json") or filename.startswith("."):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_bytes += stat.st_size
+
+        if total_bytes <= self.max_bytes:
+            self._update_size(total=total_bytes)
+            return
+
+        # least recently used first, leaving headroom so that a full cache is not walked on every write
+        entries.sort()
+        for mtime, size, path in entries:
+            if total_bytes <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError:
+                pass
+
+        self._update_size(total=total_bytes)
@@ -0,0 +1,102 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import math
+import pathlib
+import resource
+import sys
+
+# upper bound on a single read so that files without line breaks stay bounded in memory
+READ_SIZE = 64 * 1024
+
+class IngestStats:
+    """ Running totals for a document ingestion pass """
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.chunks = 0
+
+def iter_files(dir_path, file_regex):
+    """ Files under dir_path matching the glob, in a stable order """
+    paths = [path for path in pathlib.Path(dir_path).glob(file_regex) if path.is_file()]
+    for path in sorted(paths):
+        yield str(path)
+
+def iter_lines(file_path, stats=None):
+    with open(file_path, "rb") as f:
+        for raw_line in iter(lambda: f.readline(READ_SIZE), b""):
+            if stats is not None:
+                stats.bytes += len(raw_line)
+            yield raw_line.decode("utf-8", errors="replace")
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _split_long_line(line, line_tokens, chunk_size):
+    pieces = int(math.ceil(line_tokens / chunk_size))
+    piece_length = int(math.ceil(len(line) / pieces))
+    for start in range(0, len(line), piece_length):
+        yield line[start:start + piece_length]
+
+def iter_chunks(file_paths, chunk_size, chunk_overlap, count_tokens, stats=None, read_lines=iter_lines):
+    """ Yield (source, text) chunks of at most chunk_size tokens.
+
+    Lines are streamed from each file and only the chunk currently being built is
+    held in memory.  Chunks never span files and consecutive chunks within a file
+    share up to chunk_overlap tokens of trailing lines.  read_lines(file_path, stats)
+    may be replaced to preprocess each file before it is chunked.
+    """
+    for file_path in file_paths:
+        if stats is not None:
+            stats.files += 1
+
+        lines = []
+        line_tokens = []
+        total_tokens = 0
+        for line in read_lines(file_path, stats):
+            tokens = count_tokens(line)
+            segments = [(line, tokens)]
+            if tokens > chunk_size:
+                segments = [(segment, count_tokens(segment)) for segment in _split_long_line(line, tokens, chunk_size)]
+
+            for segment, segment_tokens in segments:
+                if len(lines) > 0 and total_tokens + segment_tokens > chunk_size:
+                    if stats is not None:
+                        stats.chunks += 1
+                    yield file_path, "".join(lines)
+
+                    # carry trailing lines forward as overlap with the next chunk
+                    overlap_lines = []
+                    overlap_tokens = []
+                    carried = 0
+                    for previous_line, previous_tokens in zip(reversed(lines), reversed(line_tokens)):
+                        if carried + previous_tokens > chunk_overlap or carried + previous_tokens + segment_tokens > chunk_size:
+                            break
+                        overlap_lines.insert(0, previous_line)
+                        overlap_tokens.insert(0, previous_tokens)
+                        carried += previous_tokens
+                    lines, line_tokens, total_tokens = overlap_lines, overlap_tokens, carried
+
+                lines.append(segment)
+                line_tokens.append(segment_tokens)
+                total_tokens += segment_tokens
+
+        if len(lines) > 0 and len("".join(lines).strip()) > 0:
+            if stats is not None:
+                stats.chunks += 1
+            yield file_path, "".join(lines)
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes everywhere else
+    if sys.platform == "darwin":
+        return round(peak / (1024 * 1024), 2)
+    return round(peak / 1024, 2)
@@ -0,0 +1,140 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+# Online log template mining in the style of Drain (He et al., ICWS 2017).
+#
+# Lines are masked for obviously variable fields, then routed through a fixed depth
+# parse tree keyed on token count and the leading tokens to a small set of candidate
+# templates.  A line joins the most similar candidate when enough of its tokens match,
+# turning the differing positions into wildcards, and otherwise starts a new template.
+# Memory is bounded by the number of distinct templates rather than the number of lines.
+
+import re
+
+from ansible.module_utils.openai_tokens import TIMESTAMP_PATTERN, UUID_PATTERN, IP_ADDRESS_PATTERN, HEX_PATTERN, HASH_PATTERN
+
+WILDCARD = "<*>"
+
+MASK_PATTERN = re.compile("|".join([
+    TIMESTAMP_PATTERN,
+    UUID_PATTERN,
+    IP_ADDRESS_PATTERN,
+    HEX_PATTERN,
+    HASH_PATTERN,
+    r"[-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?"     # numbers
+]))
+
+# whitespace and the separators of JSON and key=value logs delimit tokens
+TOKEN_SEPARATORS = re.compile(r"[\s,;{}\[\]]+")
+
+MAX_SAMPLE_LENGTH = 80
+
+def mask_token(token):
+    return MASK_PATTERN.sub(WILDCARD, token)
+
+def has_digits(token):
+    return any(character.isdigit() for character in token)
+
+class LogCluster:
+    __slots__ = ('template', 'count', 'first_line', 'samples')
+
+    def __init__(self, template, first_line):
+        self.template = template
+        self.count = 0
+        self.first_line = first_line
+        self.samples = []
+
+class _Node:
+    __slots__ = ('children', 'clusters')
+
+    def __init__(self):
+        self.children = {}
+        self.clusters = []
+
+class LogTemplateMiner:
+    def __init__(self, depth=4, similarity_threshold=0.5, max_children=100, max_samples=3):
+        # the first level is the token count and the last holds the clusters
+        self.prefix_depth = max(1, depth - 2)
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.max_samples = max_samples
+        self.root = {}
+        self.clusters = []
+        self.lines = 0
+        self.input_bytes = 0
+
+    def _leaf(self, masked):
+        node = self.root.setdefault(len(masked), _Node())
+        for token in masked[:self.prefix_depth]:
+            # variable looking tokens and overflowing nodes share the wildcard branch
+            key = WILDCARD if WILDCARD in token or has_digits(token) else token
+            if key not in node.children and len(node.children) >= self.max_children:
+                key = WILDCARD
+            node = node.children.setdefault(key, _Node())
+        return node
+
+    def _similarity(self, template, masked):
+        matches = 0
+        wildcards = 0
+        for template_token, token in zip(template, masked):
+            if template_token == WILDCARD:
+                wildcards += 1
+            elif template_token == token:
+                matches += 1
+        return matches / len(template), wildcards
+
+    def add(self, line):
+        self.lines += 1
+        self.input_bytes += len(line.encode("utf-8"))
+        tokens = [token for token in TOKEN_SEPARATORS.split(line) if token]
+        if len(tokens) == 0:
+            return None
+        masked = [mask_token(token) for token in tokens]
+
+        leaf = self._leaf(masked)
+        best = None
+        best_score = (-1, -1)
+        for cluster in leaf.clusters:
+            score = self._similarity(cluster.template, masked)
+            if score > best_score:
+                best, best_score = cluster, score
+
+        if best is None or best_score[0] < self.similarity_threshold:
+            best = LogCluster(masked, self.lines)
+            leaf.clusters.append(best)
+            self.clusters.append(best)
+        else:
+            best.template = [template_token if template_token == token else WILDCARD
+                             for template_token, token in zip(best.template, masked)]
+        best.count += 1
+
+        if len(best.samples) < self.max_samples:
+            variables = [token for template_token, token in zip(best.template, tokens) if WILDCARD in template_token]
+            if len(variables) > 0:
+                best.samples.append(" ".join(variables)[:MAX_SAMPLE_LENGTH])
+        return best
+
+    def render(self):
+        """ Templates in order of first appearance, each with its count and sample variable values """
+        output = [f"# {self.lines} log lines condensed to {len(self.clusters)} templates, {WILDCARD} marks variable fields\n"]
+        for cluster in self.clusters:
+            output.append(f"[{cluster.count}x from line {cluster.first_line}] {' '.join(cluster.template)}\n")
+            if cluster.count > 1 and len(cluster.samples) > 0:
+                output.append(f"    e.g. {' | '.join(cluster.samples)}\n")
+        return output
+
+def compress_lines(lines, depth=4, similarity_threshold=0.5, max_samples=3, stats=None):
+    """ Mine templates from lines and return the condensed representation as a list of lines """
+    miner = LogTemplateMiner(depth=depth, similarity_threshold=similarity_threshold, max_samples=max_samples)
+    for line in lines:
+        miner.add(line)
+    output = miner.render()
+
+    if stats is not None:
+        stats['lines'] += miner.lines
+        stats['templates'] += len(miner.clusters)
+        stats['input_bytes'] += miner.input_bytes
+        stats['output_bytes'] += sum(len(line.encode("utf-8")) for line in output)
+    return output
@@ -0,0 +1,32 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+# Consolidated telemetry returned by every module as the openai_metrics result key.
+# The openai_telemetry callback plugin aggregates these across a play, so the
+# keys here are the contract between the modules and the callback.
+
+COUNTERS = ('llm_calls', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'tool_calls',
+            'cache_hits', 'cache_misses', 'retries', 'hedged_requests', 'failed')
+
+TIMERS = ('elapsed', 'llm_latency', 'tool_latency', 'queue_wait')
+
+def new_metrics(module_name, model_name, endpoint):
+    metrics = dict(module=module_name, model=model_name, endpoint=endpoint)
+    for counter in COUNTERS:
+        metrics[counter] = 0
+    for timer in TIMERS:
+        metrics[timer] = 0.0
+    return metrics
+
+def add_usage(metrics, prompt_tokens=None, completion_tokens=None, total_tokens=None):
+    metrics['prompt_tokens'] += prompt_tokens or 0
+    metrics['completion_tokens'] += completion_tokens or 0
+    metrics['total_tokens'] += total_tokens or (prompt_tokens or 0) + (completion_tokens or 0)
+
+def finish_metrics(metrics, elapsed):
+    metrics['elapsed'] = elapsed
+    for timer in TIMERS:
+        metrics[timer] = round(metrics[timer], 4)
+    return metrics
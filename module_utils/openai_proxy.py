@@ -0,0 +1,310 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+# Long lived local broker shared by every module process on the controller.
+#
+# Modules hand their HTTP requests to the broker over a Unix socket instead of
+# connecting to the inference endpoint themselves.  The broker keeps pooled
+# keep-alive connections per endpoint and TLS configuration, so DNS, TCP and TLS
+# setup (including client certificates) is paid once rather than per task, and
+# identical non-streaming requests that are in flight at the same time from
+# parallel forks are coalesced into a single upstream call.
+#
+# Wire format, one request per connection:
+#   module -> broker: JSON header line, then content_length bytes of request body
+#   broker -> module: JSON header line with status and headers, then the raw
+#                     response body until the broker closes the connection
+
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future
+
+from ansible.module_utils.openai_cache import canonical_hash
+
+READ_SIZE = 64 * 1024
+
+# hop-by-hop headers that only describe a single connection
+HOP_BY_HOP_HEADERS = ('connection', 'keep-alive', 'transfer-encoding', 'host', 'content-length')
+
+def _write_header(sock_file, header):
+    sock_file.write(json.dumps(header).encode('utf-8') + b"\n")
+    sock_file.flush()
+
+class ProxyDaemon:
+    def __init__(self, socket_path, idle_timeout):
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.clients = {}
+        self.in_flight = {}
+        self.active_requests = 0
+        self.last_activity = time.monotonic()
+        self.lock = threading.Lock()
+
+    def client_for(self, tls):
+        import httpx
+
+        key = canonical_hash(tls)
+        with self.lock:
+            if key not in self.clients:
+                cert = None if tls.get('cert') is None else tuple(tls['cert'])
+                self.clients[key] = httpx.Client(
+                    cert=cert,
+                    verify=tls.get('verify', True),
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=self.idle_timeout)
+                )
+            return self.clients[key]
+
+    def forward(self, header, body, stream):
+        import httpx
+
+        client = self.client_for(header.get('tls', {}))
+        headers = [(name, value) for name, value in header['headers'] if name.lower() not in HOP_BY_HOP_HEADERS]
+        request = client.build_request(header['method'], header['url'], headers=headers, content=body,
+                                       timeout=httpx.Timeout(**header['timeout']) if header.get('timeout') else None)
+        return client.send(request, stream=stream)
+
+    def forward_coalesced(self, header, body):
+        """ Issue the request once for every identical request currently in flight """
+        key = canonical_hash(dict(method=header['method'], url=header['url'], headers=sorted(header['headers']),
+                                  tls=header.get('tls', {}), body=body.decode('utf-8', errors='replace')))
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.in_flight[key] = future
+
+        if leader:
+            try:
+                response = self.forward(header, body, stream=True)
+                try:
+                    content = b"".join(response.iter_raw())
+                finally:
+                    response.close()
+                future.set_result((response.status_code, list(response.headers.raw), content))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    del self.in_flight[key]
+        return future.result()
+
+    def handle(self, connection):
+        with self.lock:
+            self.active_requests += 1
+            self.last_activity = time.monotonic()
+
+        sock_file = connection.makefile('rwb')
+        try:
+            header = json.loads(sock_file.readline())
+            body = sock_file.read(header['content_length']) if header['content_length'] > 0 else b""
+
+            try:
+                if header.get('coalesce'):
+                    status, headers, content = self.forward_coalesced(header, body)
+                    _write_header(sock_file, dict(status=status, headers=self._response_headers(headers)))
+                    sock_file.write(content)
+                else:
+                    response = self.forward(header, body, stream=True)
+                    try:
+                        _write_header(sock_file, dict(status=response.status_code, headers=self._response_headers(response.headers.raw)))
+                        for chunk in response.iter_raw():
+                            sock_file.write(chunk)
+                            sock_file.flush()
+                    finally:
+                        response.close()
+            except Exception as e:
+                _write_header(sock_file, dict(error=type(e).__name__, message=str(e)))
+            sock_file.flush()
+        except (OSError, ValueError):
+            # the module went away mid request
+            pass
+        finally:
+            try:
+                sock_file.close()
+                connection.close()
+            except OSError:
+                pass
+            with self.lock:
+                self.active_requests -= 1
+                self.last_activity = time.monotonic()
+
+    def _response_headers(self, raw_headers):
+        return [(name.decode('latin-1'), value.decode('latin-1')) for name, value in raw_headers
+                if name.decode('latin-1').lower() not in ('connection', 'keep-alive', 'transfer-encoding')]
+
+    def serve(self, listener):
+        listener.settimeout(1.0)
+        while True:
+            try:
+                connection, address = listener.accept()
+            except socket.timeout:
+                with self.lock:
+                    idle = self.active_requests == 0 and time.monotonic() - self.last_activity > self.idle_timeout
+                if idle:
+                    break
+                continue
+            connection.settimeout(None)
+            threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+        listener.close()
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+        for client in self.clients.values():
+            client.close()
+
+def _is_listening(socket_path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.settimeout(1.0)
+        probe.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+def ensure_proxy_daemon(socket_path, idle_timeout=300, startup_timeout=5.0):
+    """ Start the broker for socket_path unless one is already listening """
+    socket_path = os.path.abspath(os.path.expanduser(socket_path))
+    if _is_listening(socket_path):
+        return socket_path
+
+    socket_dir = os.path.dirname(socket_path)
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+
+    # serialize startup across forks racing to launch the broker
+    with open(socket_path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if _is_listening(socket_path):
+                return socket_path
+            try:
+                os.remove(socket_path)
+            except OSError:
+                pass
+
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(socket_path)
+            os.chmod(socket_path, 0o600)
+            listener.listen(128)
+
+            # the module's own files are removed once it exits, so load everything the broker needs first
+            import httpx
+            httpx.Client().close()
+
+            _spawn(ProxyDaemon(socket_path, idle_timeout), listener)
+            listener.close()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if _is_listening(socket_path):
+            return socket_path
+        time.sleep(0.05)
+    raise OSError(f"Proxy daemon did not start listening on {socket_path}")
+
+def _spawn(daemon, listener):
+    pid = os.fork()
+    if pid > 0:
+        os.waitpid(pid, 0)
+        return
+
+    # first child - detach from the module's session and fork again so the broker is reparented
+    try:
+        os.setsid()
+        if os.fork() > 0:
+            os._exit(0)
+
+        # the module's stdout is how Ansible reads its result, so the broker must not hold it open
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        os.close(devnull)
+
+        daemon.serve(listener)
+    finally:
+        os._exit(0)
+
+def create_proxy_transport(socket_path, cert=None, verify=True):
+    """ httpx transport that sends every request through the broker listening on socket_path """
+    import httpx
+
+    class SocketByteStream(httpx.SyncByteStream):
+        def __init__(self, sock_file, sock):
+            self.sock_file = sock_file
+            self.sock = sock
+
+        def __iter__(self):
+            for chunk in iter(lambda: self.sock_file.read1(READ_SIZE), b""):
+                yield chunk
+
+        def close(self):
+            self.sock_file.close()
+            self.sock.close()
+
+    class ProxyTransport(httpx.BaseTransport):
+        def handle_request(self, request):
+            body = request.read()
+            timeout = request.extensions.get('timeout') or {}
+
+            # identical non-streaming completions from parallel forks can share one upstream call
+            coalesce = False
+            if request.method == 'POST' and len(body) > 0:
+                try:
+                    coalesce = not json.loads(body).get('stream', False)
+                except (ValueError, AttributeError):
+                    coalesce = False
+
+            header = dict(
+                method=request.method,
+                url=str(request.url),
+                headers=[(name.decode('latin-1'), value.decode('latin-1')) for name, value in request.headers.raw],
+                content_length=len(body),
+                timeout=timeout,
+                coalesce=coalesce,
+                tls=dict(cert=None if cert is None else list(cert), verify=verify)
+            )
+
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(timeout.get('connect'))
+                sock.connect(socket_path)
+                sock.settimeout(timeout.get('read'))
+                sock_file = sock.makefile('rwb')
+                _write_header(sock_file, header)
+                sock_file.write(body)
+                sock_file.flush()
+
+                response_header = json.loads(sock_file.readline() or b"{}")
+            except socket.timeout as e:
+                sock.close()
+                raise httpx.ReadTimeout(str(e), request=request)
+            except (OSError, ValueError) as e:
+                sock.close()
+                raise httpx.ConnectError(f"Unable to reach proxy daemon at {socket_path}: {e}", request=request)
+
+            if 'error' in response_header:
+                sock_file.close()
+                sock.close()
+                if 'Timeout' in response_header['error']:
+                    raise httpx.TimeoutException(response_header['message'], request=request)
+                raise httpx.ConnectError(response_header['message'], request=request)
+
+            return httpx.Response(
+                status_code=response_header['status'],
+                headers=response_header['headers'],
+                stream=SocketByteStream(sock_file, sock),
+                request=request
+            )
+
+    return ProxyTransport()
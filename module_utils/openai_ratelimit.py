@@ -0,0 +1,85 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import fcntl
+import os
+import struct
+import time
+
+from ansible.module_utils.openai_cache import canonical_hash
+
+# bucket file layout: request bucket level, token bucket level and the time they were last refilled
+BUCKET_STATE = struct.Struct("<ddd")
+
+class RateLimiter:
+    """ Token buckets on requests per second and tokens per minute shared between Ansible forks.
+
+    The bucket levels live in a small file per endpoint and model, updated under an exclusive
+    lock, so every module process on the controller draws from the same budget.  Callers
+    reserve capacity up front, letting the levels go negative, and then sleep until the
+    buckets have refilled past their reservation.  Each acquire is therefore a single short
+    critical section and waiting callers are served in the order they arrived.  Token usage
+    is estimated before the request and settled against the reported usage afterwards.
+    """
+
+    def __init__(self, state_dir, endpoint_url, model_name, requests_per_second=None, tokens_per_minute=None):
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        key = canonical_hash(dict(endpoint_url=endpoint_url, model=model_name))
+        self.path = os.path.join(os.path.expanduser(state_dir), f"{key}.bucket")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def _capacities(self):
+        # a second of requests and a minute of tokens may be spent in a burst
+        request_capacity = None if self.requests_per_second == None else max(1.0, self.requests_per_second)
+        return request_capacity, self.tokens_per_minute
+
+    def _update(self, request_delta, token_delta):
+        """ Refill both buckets, apply the deltas and return the resulting levels """
+        request_capacity, token_capacity = self._capacities()
+        with open(self.path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                f.seek(0)
+                state = f.read(BUCKET_STATE.size)
+                if len(state) == BUCKET_STATE.size:
+                    request_level, token_level, updated = BUCKET_STATE.unpack(state)
+                else:
+                    # new buckets start full
+                    request_level, token_level, updated = request_capacity or 0.0, token_capacity or 0.0, now
+
+                elapsed = max(0.0, now - updated)
+                if request_capacity != None:
+                    request_level = min(request_capacity, request_level + elapsed * self.requests_per_second) + request_delta
+                if token_capacity != None:
+                    token_level = min(token_capacity, token_level + elapsed * self.tokens_per_minute / 60.0) + token_delta
+
+                f.seek(0)
+                f.truncate()
+                f.write(BUCKET_STATE.pack(request_level, token_level, now))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return request_level, token_level
+
+    def acquire(self, tokens=0):
+        """ Reserve one request and the estimated tokens, sleeping until they are available.  Returns the seconds waited """
+        request_level, token_level = self._update(-1.0, -tokens if self.tokens_per_minute != None else 0)
+
+        wait = 0.0
+        if self.requests_per_second != None and request_level < 0:
+            wait = max(wait, -request_level / self.requests_per_second)
+        if self.tokens_per_minute != None and token_level < 0:
+            wait = max(wait, -token_level * 60.0 / self.tokens_per_minute)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def settle(self, reserved_tokens, used_tokens):
+        """ Correct the token bucket once the actual usage of a request is known """
+        if self.tokens_per_minute == None or used_tokens == None or used_tokens == reserved_tokens:
+            return
+        self._update(0.0, reserved_tokens - used_tokens)
@@ -0,0 +1,195 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import email.utils
+import random
+import threading
+import time
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+def retry_after_seconds(exception):
+    """ Delay requested by the server through the Retry-After family of headers, if any """
+    response = getattr(exception, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(exception):
+    import openai
+
+    # connection failures and timeouts never reached a healthy server
+    if isinstance(exception, openai.APIConnectionError):
+        return True
+    if isinstance(exception, openai.APIStatusError):
+        return exception.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+def run_in_daemon_thread(fn, *args):
+    """ Run fn on a daemon thread so that an abandoned request cannot block the module from exiting """
+    future = Future()
+
+    def runner():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=runner, daemon=True).start()
+    return future
+
+class Endpoint:
+    def __init__(self, url, client, weight=1):
+        self.url = url
+        self.client = client
+        self.weight = max(1, weight)
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0
+
+    def stats(self):
+        return dict(url=self.url, weight=self.weight, requests=self.requests, failures=self.failures,
+                    ejected=self.ejected_until > time.monotonic())
+
+class EndpointPool:
+    """ Routes requests across replicas of the same model with retries, health ejection and hedging.
+
+    routing is either 'weighted' (random by weight) or 'least_outstanding' (fewest in-flight
+    requests relative to weight).  An endpoint that fails eject_after times in a row is taken out
+    of rotation for eject_seconds, unless every endpoint is ejected in which case all are used.
+    """
+
+    def __init__(self, endpoints, routing='weighted', max_retries=2, backoff_base=0.5, backoff_max=30.0,
+                 hedge_after=None, eject_after=3, eject_seconds=30):
+        self.endpoints = endpoints
+        self.routing = routing
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.retries = 0
+        self.hedged_requests = 0
+        self.lock = threading.Lock()
+
+    def select(self, exclude=()):
+        with self.lock:
+            now = time.monotonic()
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+            if len(candidates) == 0:
+                candidates = list(self.endpoints)
+            healthy = [endpoint for endpoint in candidates if endpoint.ejected_until <= now]
+            if len(healthy) > 0:
+                candidates = healthy
+
+            if self.routing == 'least_outstanding':
+                lowest = min(endpoint.outstanding / endpoint.weight for endpoint in candidates)
+                endpoint = random.choice([endpoint for endpoint in candidates if endpoint.outstanding / endpoint.weight == lowest])
+            else:
+                endpoint = random.choices(candidates, weights=[endpoint.weight for endpoint in candidates])[0]
+
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint, exception=None):
+        with self.lock:
+            endpoint.outstanding -= 1
+            if exception is None:
+                endpoint.consecutive_failures = 0
+            elif is_retryable(exception):
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.eject_after:
+                    endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    def backoff(self, attempt, exception):
+        # honour the server's requested delay, bounded so a single task cannot stall indefinitely
+        retry_after = retry_after_seconds(exception)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # full jitter exponential backoff
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _call_endpoint(self, request_fn, endpoint):
+        try:
+            result = request_fn(endpoint)
+        except Exception as e:
+            self.release(endpoint, e)
+            raise
+        self.release(endpoint)
+        return result
+
+    def _call_hedged(self, request_fn, endpoint):
+        primary = run_in_daemon_thread(self._call_endpoint, request_fn, endpoint)
+        done, pending = wait([primary], timeout=self.hedge_after)
+        if len(done) > 0 or len(self.endpoints) < 2:
+            return primary.result()
+
+        # the primary is slow so race a second request against another replica
+        with self.lock:
+            self.hedged_requests += 1
+        secondary = run_in_daemon_thread(self._call_endpoint, request_fn, self.select(exclude=(endpoint,)))
+        futures = [primary, secondary]
+        while len(futures) > 0:
+            done, pending = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+            if len(pending) == 0:
+                raise done.pop().exception()
+            futures = list(pending)
+
+    def call(self, request_fn):
+        """ Invoke request_fn(endpoint), retrying retryable failures on another endpoint where possible """
+        attempt = 0
+        previous = ()
+        while True:
+            endpoint = self.select(exclude=previous)
+            try:
+                if self.hedge_after is not None:
+                    return self._call_hedged(request_fn, endpoint)
+                return self._call_endpoint(request_fn, endpoint)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                with self.lock:
+                    self.retries += 1
+                time.sleep(self.backoff(attempt, e))
+                attempt += 1
+                previous = (endpoint,)
+
+    def stats(self):
+        return dict(
+            retries=self.retries,
+            hedged_requests=self.hedged_requests,
+            endpoints=[endpoint.stats() for endpoint in self.endpoints]
+        )
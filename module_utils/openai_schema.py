@@ -0,0 +1,67 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import re
+import threading
+
+from ansible.module_utils.openai_cache import canonical_hash
+
+# how much of the schema the endpoint enforces, from strongest to weakest.  Servers that reject
+# a response_format are downgraded one step at a time, ending with the schema only in the prompt.
+RESPONSE_FORMAT_MODES = ('json_schema', 'json_object', 'prompt')
+
+CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*\n(.*?)\n\s*```\s*$", re.DOTALL)
+
+_validators = {}
+_validators_lock = threading.Lock()
+
+def get_validator(schema):
+    """ Validator for the schema, checked and built once per distinct schema.
+
+    Raises ImportError when jsonschema is not installed and jsonschema.SchemaError when the
+    schema itself is invalid.
+    """
+    key = canonical_hash(schema)
+    with _validators_lock:
+        if key not in _validators:
+            # imported on first use so modules without a response schema do not pay for it
+            import jsonschema
+
+            validator_class = jsonschema.validators.validator_for(schema)
+            validator_class.check_schema(schema)
+            _validators[key] = validator_class(schema, format_checker=validator_class.FORMAT_CHECKER)
+        return _validators[key]
+
+def response_format(schema, mode, name="response"):
+    if mode == 'json_schema':
+        return {"type": "json_schema", "json_schema": {"name": name, "schema": schema}}
+    if mode == 'json_object':
+        return {"type": "json_object"}
+    return None
+
+def schema_instructions(schema):
+    return f"Respond only with a JSON document, without any other text, that conforms to this JSON schema: {json.dumps(schema, sort_keys=True)}"
+
+def parse_response(text, schema):
+    """ Parse and validate a reply, returning (parsed, errors) where errors is empty on success """
+    if text == None:
+        return None, ["response is empty"]
+
+    # models frequently wrap JSON in a markdown code fence even when asked not to
+    match = CODE_FENCE.match(text)
+    if match:
+        text = match.group(1)
+
+    try:
+        parsed = json.loads(text)
+    except ValueError as e:
+        return None, [f"response is not valid JSON: {e}"]
+
+    errors = []
+    for error in sorted(get_validator(schema).iter_errors(parsed), key=lambda error: list(error.absolute_path)):
+        location = "/".join(str(part) for part in error.absolute_path) or "(root)"
+        errors.append(f"{location}: {error.message}")
+    return parsed, errors
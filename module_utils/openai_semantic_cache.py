@@ -0,0 +1,205 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import array
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+import time
+
+from ansible.module_utils.openai_tokens import TIMESTAMP_PATTERN, UUID_PATTERN, IP_ADDRESS_PATTERN, HEX_PATTERN, HASH_PATTERN
+
+# volatile identifiers in alerts and log lines that should not make two prompts look different,
+# most specific first so that e.g. an IP address is not consumed as four numbers
+NORMALIZE_PATTERNS = [
+    (re.compile(TIMESTAMP_PATTERN), "<ts>"),
+    (re.compile(r"\b[A-Z][a-z]{2} +\d{1,2} \d{2}:\d{2}:\d{2}\b"), "<ts>"),
+    (re.compile(UUID_PATTERN), "<uuid>"),
+    (re.compile(IP_ADDRESS_PATTERN), "<ip>"),
+    (re.compile(HEX_PATTERN), "<hex>"),
+    # generated pod and replica set suffixes, i.e. web-7d9f8b6c5d-x2klm
+    (re.compile(r"\b([a-z0-9]+(?:-[a-z0-9]+)*?)-[a-f0-9]{8,10}-[a-z0-9]{5}\b"), r"\1-<pod>"),
+    (re.compile(r"\b([a-z0-9]+(?:-[a-z0-9]+)*?)-(?=[a-z]*\d)[a-z0-9]{5}\b(?=[^-]|$)"), r"\1-<id>"),
+    (re.compile(HASH_PATTERN), "<hash>"),
+    # numbered hosts and devices, i.e. ocpworker1 or sda3.  Standalone numbers such as usage
+    # percentages and status codes change the meaning of an alert and are kept.
+    (re.compile(r"(?<=[A-Za-z])\d+"), "<n>"),
+]
+
+TOKEN_PATTERN = re.compile(r"<\w+>|\w+")
+
+HASHING_DIMENSIONS = 512
+
+# index file layout: header, then fixed size records of scope digest, entry digest,
+# created and last used timestamps and the unit length embedding as float32
+INDEX_MAGIC = b"OAISEM01"
+HEADER = struct.Struct("<8sII")
+RECORD_META = struct.Struct("<32s32sdd")
+
+def normalize_prompt(text):
+    for pattern, replacement in NORMALIZE_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return " ".join(text.lower().split())
+
+def unit_vector(vector):
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        return vector
+    return [value / norm for value in vector]
+
+def hashing_embedding(text, dimensions=HASHING_DIMENSIONS):
+    """ Signed feature hashing of words and word bigrams, needing no model or network access """
+    tokens = TOKEN_PATTERN.findall(text)
+    features = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+    vector = [0.0] * dimensions
+    for feature in features:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[digest % dimensions] += 1.0 if (digest >> 63) & 1 else -1.0
+    return unit_vector(vector)
+
+class SemanticIndex:
+    """ Fixed capacity, memory-mapped nearest neighbour index shared between Ansible forks.
+
+    Each record maps an embedding to the key of a response held in a ResponseCache.  Records
+    are partitioned by scope so that only prompts sent with the same model, system prompt,
+    tools and sampling parameters can match.  When the index is full the least recently used
+    record is overwritten.  Readers take a shared lock and writers an exclusive lock on the file.
+    numpy is used for the similarity scan when it is installed.
+    """
+
+    def __init__(self, index_dir, dimensions, capacity=10000):
+        self.path = os.path.join(os.path.expanduser(index_dir), f"semantic_{dimensions}.idx")
+        self.dimensions = dimensions
+        self.capacity = capacity
+        self.record_size = RECORD_META.size + 4 * dimensions
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def _open(self):
+        f = open(self.path, "a+b")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0, os.SEEK_END)
+            size = HEADER.size + self.capacity * self.record_size
+            existing = f.tell()
+            header_ok = False
+            if existing >= HEADER.size:
+                f.seek(0)
+                magic, dimensions, capacity = HEADER.unpack(f.read(HEADER.size))
+                header_ok = magic == INDEX_MAGIC and dimensions == self.dimensions and capacity == self.capacity
+            if not header_ok or existing != size:
+                # new index or one written with another layout, start over
+                f.truncate(0)
+                f.write(HEADER.pack(INDEX_MAGIC, self.dimensions, self.capacity))
+                f.truncate(size)
+                f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+        return f
+
+    def _records(self, mapped):
+        for slot in range(self.capacity):
+            offset = HEADER.size + slot * self.record_size
+            yield slot, offset, RECORD_META.unpack_from(mapped, offset)
+
+    def _scan(self, mapped, scope, vector):
+        """ Best (similarity, slot, key) within scope """
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+        if numpy is not None:
+            dtype = numpy.dtype([("scope", "S32"), ("key", "S32"), ("created", "<f8"), ("last_used", "<f8"),
+                                 ("vector", "<f4", (self.dimensions,))])
+            records = numpy.frombuffer(mapped, dtype=dtype, count=self.capacity, offset=HEADER.size)
+            candidates = numpy.flatnonzero((records["created"] > 0) & (records["scope"] == numpy.bytes_(scope)))
+            if len(candidates) == 0:
+                return None
+            similarities = records["vector"][candidates] @ numpy.asarray(vector, dtype="<f4")
+            best = int(numpy.argmax(similarities))
+            slot = int(candidates[best])
+            return float(similarities[best]), slot, bytes(records["key"][slot]).ljust(32, b"\0")
+
+        best = None
+        query = array.array("f", vector)
+        for slot, offset, (record_scope, key, created, last_used) in self._records(mapped):
+            if created == 0 or record_scope != scope:
+                continue
+            stored = array.array("f")
+            stored.frombytes(mapped[offset + RECORD_META.size:offset + self.record_size])
+            similarity = sum(a * b for a, b in zip(query, stored))
+            if best is None or similarity > best[0]:
+                best = (similarity, slot, key)
+        return best
+
+    def lookup(self, scope, vector, threshold):
+        """ Entry key of the most similar prompt in scope, with its similarity, or (None, similarity) """
+        with self._open() as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    best = self._scan(mapped, bytes.fromhex(scope), vector)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        if best is None:
+            return None, None
+        similarity, slot, key = best
+        if similarity < threshold:
+            return None, similarity
+        self._touch(slot)
+        return key.hex(), similarity
+
+    def _touch(self, slot):
+        with self._open() as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                with mmap.mmap(f.fileno(), 0) as mapped:
+                    offset = HEADER.size + slot * self.record_size
+                    scope, key, created, last_used = RECORD_META.unpack_from(mapped, offset)
+                    if created > 0:
+                        RECORD_META.pack_into(mapped, offset, scope, key, created, time.time())
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def add(self, scope, key, vector):
+        with self._open() as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                with mmap.mmap(f.fileno(), 0) as mapped:
+                    # an empty slot, otherwise the least recently used record
+                    victim = None
+                    oldest_last_used = None
+                    for slot, offset, (record_scope, record_key, created, last_used) in self._records(mapped):
+                        if created == 0:
+                            victim = slot
+                            break
+                        if oldest_last_used is None or last_used < oldest_last_used:
+                            victim, oldest_last_used = slot, last_used
+
+                    offset = HEADER.size + victim * self.record_size
+                    now = time.time()
+                    RECORD_META.pack_into(mapped, offset, bytes.fromhex(scope), bytes.fromhex(key), now, now)
+                    mapped[offset + RECORD_META.size:offset + self.record_size] = array.array("f", vector).tobytes()
+                    mapped.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def remove(self, key):
+        """ Forget a record whose response is no longer in the response cache """
+        key = bytes.fromhex(key)
+        with self._open() as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                with mmap.mmap(f.fileno(), 0) as mapped:
+                    for slot, offset, (record_scope, record_key, created, last_used) in self._records(mapped):
+                        if created > 0 and record_key == key:
+                            RECORD_META.pack_into(mapped, offset, record_scope, record_key, 0, 0)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,85 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import fcntl
+import json
+import os
+import time
+
+from ansible.module_utils.openai_cache import canonical_hash, write_json_atomic
+
+class ConversationSession:
+    """ Conversation history persisted between tasks that share a session id.
+
+    The history is stored as the exact messages that were sent, so replaying it reproduces
+    the previous request byte for byte and the server can reuse its cached prefix.  When the
+    history grows past max_turns the oldest turns are dropped in one block, down to half of
+    max_turns, rather than one turn at a time.  The prefix then stays stable for many turns
+    between drops instead of changing on every call.  An exclusive lock is held from open
+    until close so that concurrent tasks on the same session are applied one after another.
+    """
+
+    def __init__(self, session_dir, session_id, max_turns=20):
+        self.session_id = session_id
+        self.max_turns = max_turns
+        session_dir = os.path.expanduser(session_dir)
+        os.makedirs(session_dir, exist_ok=True)
+        self.path = os.path.join(session_dir, canonical_hash(session_id) + ".json")
+        self.turns = []
+        self.dropped_turns = 0
+        self.history_messages = 0
+        self.lock_file = None
+
+    def open(self, reset=False):
+        self.lock_file = open(self.path + ".lock", "a")
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        if reset:
+            return self
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.turns = json.load(f).get("turns", [])
+        except (OSError, ValueError):
+            self.turns = []
+        return self
+
+    def close(self):
+        if self.lock_file != None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def messages(self):
+        """ History to place between the system prompt and the new user message """
+        history = [message for turn in self.turns for message in turn]
+        self.history_messages = len(history)
+        return history
+
+    def _keep_newest(self, keep):
+        self.dropped_turns += len(self.turns) - keep
+        self.turns = self.turns[len(self.turns) - keep:]
+
+    def add_turn(self, messages):
+        self.turns.append(messages)
+        if len(self.turns) > self.max_turns:
+            self._keep_newest(max(1, self.max_turns // 2))
+
+    def drop_oldest(self):
+        """ Drop the older half of the history in one block, returning False once there is nothing left to drop """
+        if len(self.turns) == 0:
+            return False
+        self._keep_newest(len(self.turns) // 2)
+        return True
+
+    def save(self):
+        write_json_atomic(self.path, {"session_id": self.session_id, "updated": time.time(), "turns": self.turns})
+
+    def stats(self):
+        return dict(id=self.session_id, turns=len(self.turns), history_messages=self.history_messages, dropped_turns=self.dropped_turns)
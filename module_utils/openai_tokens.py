@@ -0,0 +1,153 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import math
+import re
+import threading
+
+# rough characters per token for English text and logs when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# tokens the chat format adds around every message, plus the primer for the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMER_TOKENS = 3
+
+TRIM_MARKER = "\n... [{count} tokens trimmed] ...\n"
+
+# volatile fragments of log lines, shared by the log deduplication, template mining and
+# semantic cache normalization
+TIMESTAMP_PATTERN = r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"
+UUID_PATTERN = r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"
+IP_ADDRESS_PATTERN = r"\b(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?\b"
+HEX_PATTERN = r"\b0x[0-9a-fA-F]+\b"
+HASH_PATTERN = r"\b[0-9a-f]{12,64}\b"
+
+# volatile fragments ignored when deciding whether two log lines repeat each other
+VOLATILE_PATTERNS = re.compile("|".join([
+    TIMESTAMP_PATTERN,
+    HEX_PATTERN,
+    UUID_PATTERN,
+    r"\d+(?:\.\d+)?"     # counters, ids, durations
+]))
+
+# continuation lines of a multi-line log entry such as a stack trace
+CONTINUATION_LINE = re.compile(r"^(?:\s+|Caused by:|\.\.\. \d+ more)")
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+def get_encoding(model_name=None):
+    """ Tokenizer for the model, falling back to a general purpose encoding for models tiktoken does not know """
+    with _encodings_lock:
+        if model_name in _encodings:
+            return _encodings[model_name]
+
+        # imported on first use so callers that never count tokens do not pay for it
+        try:
+            import tiktoken
+        except ImportError:
+            _encodings[model_name] = None
+            return None
+
+        encoding = None
+        try:
+            encoding = tiktoken.encoding_for_model(model_name) if model_name else tiktoken.get_encoding(DEFAULT_ENCODING)
+        except KeyError:
+            try:
+                encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+            except Exception:
+                encoding = None
+        except Exception:
+            # encoding files could not be loaded, i.e. no network access to fetch them
+            encoding = None
+
+        _encodings[model_name] = encoding
+        return encoding
+
+def count_tokens(text, model_name=None):
+    if not text:
+        return 0
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages, tools=None, model_name=None):
+    """ Approximate prompt size of a chat request as the server will see it """
+    total = REPLY_PRIMER_TOKENS
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get('content') or "", model_name)
+        if message.get('tool_calls'):
+            total += count_tokens(json.dumps(message['tool_calls']), model_name)
+    if tools:
+        total += count_tokens(json.dumps(tools), model_name)
+    return total
+
+def _log_entries(text):
+    """ Group lines into entries, keeping stack trace frames with the line that raised them """
+    entries = []
+    for line in text.splitlines():
+        if len(entries) > 0 and CONTINUATION_LINE.match(line):
+            entries[-1].append(line)
+        else:
+            entries.append([line])
+    return entries
+
+def dedupe_log_lines(text):
+    """ Collapse repeated log entries, ignoring timestamps, ids and other numbers.
+
+    An entry that repeats anywhere in the text, whether a single line or a multi-line entry
+    such as a stack trace, is kept at its first occurrence with a count of the later repeats
+    and dropped everywhere else.
+    """
+    output = []
+    first_seen = {}
+    repeats = {}
+
+    for entry in _log_entries(text):
+        key = VOLATILE_PATTERNS.sub("#", "\n".join(entry)).strip()
+        if len(key) == 0:
+            output.extend(entry)
+            continue
+        if key in first_seen:
+            repeats[key] += 1
+            continue
+        first_seen[key] = len(output)
+        repeats[key] = 0
+        output.extend(entry)
+
+    for key, index in first_seen.items():
+        if repeats[key] > 0:
+            output[index] += f" ... [repeated {repeats[key]} more times]"
+
+    deduped = "\n".join(output)
+    if text.endswith("\n"):
+        deduped += "\n"
+    return deduped
+
+def _split_tokens(text, model_name):
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        pieces = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+        return pieces, "".join
+    return encoding.encode(text, disallowed_special=()), encoding.decode
+
+def truncate_tokens(text, max_tokens, strategy="head_tail", model_name=None):
+    """ Trim text to at most max_tokens, keeping the head, the tail or both ends """
+    tokens, decode = _split_tokens(text, model_name)
+    if len(tokens) <= max_tokens:
+        return text
+
+    marker = TRIM_MARKER.format(count=len(tokens) - max_tokens)
+    keep = max(0, max_tokens - count_tokens(marker, model_name))
+    if strategy == "head":
+        return decode(tokens[:keep]) + marker
+    if strategy == "tail":
+        return marker + decode(tokens[len(tokens) - keep:])
+    head = keep // 2
+    return decode(tokens[:head]) + marker + decode(tokens[len(tokens) - (keep - head):])
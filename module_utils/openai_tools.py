@@ -0,0 +1,325 @@
+# Copyright: (c) 2024, Lee Roland <glroland@hotmail.com>
+# Apache License Version 2.0, January 2004 (http://www.apache.org/licenses/)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import ast
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import Future
+
+from ansible.module_utils.openai_cache import ResponseCache, canonical_hash, write_json_atomic
+
+REQUIRED_ATTRIBUTES = ('tool_name', 'tool_definition', 'tool_function')
+
+# bump when the manifest layout changes so stale manifests are rebuilt
+MANIFEST_VERSION = 3
+
+class ToolLoadError(Exception):
+    pass
+
+def _evaluate(node, names):
+    """ Evaluate a literal expression, allowing references to previously assigned literals and f-strings over them """
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id not in names:
+            raise ValueError(f"Unresolved name: {node.id}")
+        return names[node.id]
+    if isinstance(node, ast.Dict):
+        if any(key is None for key in node.keys):
+            raise ValueError("Dictionary unpacking is not supported")
+        return {_evaluate(key, names): _evaluate(value, names) for key, value in zip(node.keys, node.values)}
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_evaluate(element, names) for element in node.elts]
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.FormattedValue):
+                if value.conversion != -1 or value.format_spec is not None:
+                    raise ValueError("Formatted values with conversions are not supported")
+                parts.append(str(_evaluate(value.value, names)))
+            else:
+                parts.append(_evaluate(value, names))
+        return "".join(parts)
+    raise ValueError(f"Unsupported expression: {type(node).__name__}")
+
+def extract_tool_spec(file_path):
+    """ Read the tool metadata from source without executing it, so heavy tool dependencies are not imported """
+    with open(file_path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=file_path)
+
+    names = {}
+    has_function = False
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            try:
+                names[node.targets[0].id] = _evaluate(node.value, names)
+            except ValueError:
+                names.pop(node.targets[0].id, None)
+        elif isinstance(node, ast.FunctionDef) and node.name == 'tool_function':
+            has_function = True
+
+    if not has_function:
+        raise ToolLoadError(f"Tool module {file_path} does not define tool_function")
+    if 'tool_name' not in names or 'tool_definition' not in names:
+        return None
+
+    return dict(
+        tool_name=names['tool_name'],
+        tool_definition=names['tool_definition'],
+        tool_prompt_addendum=names.get('tool_prompt_addendum', ""),
+        tool_cache_ttl=names.get('tool_cache_ttl')
+    )
+
+def validate_tool_spec(file_path, spec):
+    if not isinstance(spec['tool_name'], str) or len(spec['tool_name']) == 0:
+        raise ToolLoadError(f"Tool module {file_path} must define tool_name as a non-empty string")
+    definition = spec['tool_definition']
+    if not isinstance(definition, dict) or not isinstance(definition.get('function'), dict):
+        raise ToolLoadError(f"Tool module {file_path} must define tool_definition as an OpenAI function tool")
+    if definition['function'].get('name') != spec['tool_name']:
+        raise ToolLoadError(f"Tool module {file_path} tool_definition name does not match tool_name {spec['tool_name']}")
+    if not isinstance(spec['tool_prompt_addendum'], str):
+        raise ToolLoadError(f"Tool module {file_path} must define tool_prompt_addendum as a string")
+    if spec['tool_cache_ttl'] is not None and (not isinstance(spec['tool_cache_ttl'], int) or isinstance(spec['tool_cache_ttl'], bool) or spec['tool_cache_ttl'] < 0):
+        raise ToolLoadError(f"Tool module {file_path} must define tool_cache_ttl as a non-negative number of seconds")
+
+def tool_module_name(file_path):
+    """ Unique sys.modules key per tool file so tools never collide with each other """
+    stem = re.sub(r'\W', '_', os.path.splitext(os.path.basename(file_path))[0])
+    return "openai_tool_%s_%s" % (stem, hashlib.sha1(file_path.encode('utf-8')).hexdigest()[:8])
+
+def import_tool_module(file_path):
+    module_name = tool_module_name(file_path)
+    module = sys.modules.get(module_name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(module_name, file_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except Exception:
+            del sys.modules[module_name]
+            raise
+    return module
+
+class ToolContext:
+    """ Clients shared by every tool call within a single module run.
+
+    Tools that accept a context argument fetch their clients from here so that
+    keep-alive connections are reused when the LLM calls a tool several times.
+    Results of tools that declare a tool_cache_ttl are memoized here as well, in
+    memory for the module run and in cache_dir across runs and forks.
+    """
+
+    # pooled connections per host for the shared HTTP session, sized for concurrent tool calls
+    HTTP_POOL_SIZE = 16
+
+    def __init__(self, cache_dir=None, cache_max_size_mb=50):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._stores = {}
+        self.cache_dir = cache_dir
+        self.cache_max_size_mb = cache_max_size_mb
+        self.cache_hits = 0
+
+    def client(self, key, factory):
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = factory()
+            return self._clients[key]
+
+    def http_session(self):
+        def create_session():
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.HTTP_POOL_SIZE, pool_maxsize=self.HTTP_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            return session
+        return self.client("requests.Session", create_session)
+
+    def _store(self, ttl):
+        if self.cache_dir is None:
+            return None
+        with self._lock:
+            if ttl not in self._stores:
+                self._stores[ttl] = ResponseCache(self.cache_dir, ttl=ttl, max_size_mb=self.cache_max_size_mb)
+            return self._stores[ttl]
+
+    def memoize(self, key, ttl, fn):
+        """ Result of fn for key, shared with identical calls in flight and reused from the store within ttl """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.cache_hits += 1
+        if not leader:
+            return future.result()
+
+        try:
+            store = self._store(ttl)
+            entry = None if store is None else store.get(key)
+            if entry is not None:
+                with self._lock:
+                    self.cache_hits += 1
+                result = entry['result']
+            else:
+                result = fn()
+                if store is not None:
+                    store.put(key, dict(result=result))
+        except BaseException as e:
+            # failures are not memoized, the next call tries again
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients = {}
+        for client in clients:
+            close = getattr(client, 'close', None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+class Tool:
+    """ A tool whose metadata is available immediately and whose implementation is imported on first call """
+
+    def __init__(self, file_path, spec, context=None):
+        self.file_path = file_path
+        self.tool_name = spec['tool_name']
+        self.tool_definition = spec['tool_definition']
+        self.tool_prompt_addendum = spec['tool_prompt_addendum']
+        self.tool_cache_ttl = spec.get('tool_cache_ttl')
+        self.context = context
+        self._module = None
+        self._accepts_context = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._module is None:
+                module = import_tool_module(self.file_path)
+                missing = [attribute for attribute in REQUIRED_ATTRIBUTES if not hasattr(module, attribute)]
+                if len(missing) > 0:
+                    raise ToolLoadError(f"Tool module {self.file_path} is missing required attributes: {', '.join(missing)}")
+                if module.tool_name != self.tool_name:
+                    raise ToolLoadError(f"Tool module {self.file_path} tool_name changed since it was registered")
+                self._accepts_context = 'context' in inspect.signature(module.tool_function).parameters
+                self._module = module
+            return self._module
+
+    def _invoke(self, module, ansible_module, args):
+        if self._accepts_context:
+            return module.tool_function(ansible_module, args, context=self.context)
+        return module.tool_function(ansible_module, args)
+
+    def tool_function(self, ansible_module, args):
+        module = self.load()
+        if not self.tool_cache_ttl or self.context is None:
+            return self._invoke(module, ansible_module, args)
+
+        # equivalent arguments, i.e. coordinates differing only in the fifth decimal, share a result.
+        # The normalized form only keys the cache, the tool itself still receives the arguments as sent.
+        normalize = getattr(module, 'tool_normalize_args', None)
+        key_args = args if normalize is None else normalize(args)
+        key = canonical_hash(dict(tool=self.file_path, args=key_args))
+        return self.context.memoize(key, self.tool_cache_ttl, lambda: self._invoke(module, ansible_module, args))
+
+class ToolRegistry:
+    """ Locates tool modules on a search path and caches their metadata in a serialized manifest """
+
+    def __init__(self, search_path, manifest_path=None, cache_dir=None, cache_max_size_mb=50):
+        self.search_path = [os.path.abspath(os.path.expanduser(path)) for path in search_path]
+        self.manifest_path = None if manifest_path is None else os.path.expanduser(manifest_path)
+        self.tools = {}
+        self.context = ToolContext(cache_dir, cache_max_size_mb)
+        self._manifest = self._read_manifest()
+        self._manifest_dirty = False
+
+    def _read_manifest(self):
+        if self.manifest_path is None:
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest.get('tools', {})
+
+    def save_manifest(self):
+        if self.manifest_path is None or not self._manifest_dirty:
+            return
+        manifest_dir = os.path.dirname(os.path.abspath(self.manifest_path))
+        os.makedirs(manifest_dir, exist_ok=True)
+
+        # atomic replace so concurrent forks never read a partially written manifest.  Keys keep
+        # their source order so tools read back from the manifest serialize exactly as on the first run
+        write_json_atomic(os.path.abspath(self.manifest_path), dict(version=MANIFEST_VERSION, tools=self._manifest))
+        self._manifest_dirty = False
+
+    def resolve(self, filename):
+        if os.path.isabs(filename):
+            if os.path.isfile(filename):
+                return filename
+        else:
+            for directory in self.search_path:
+                file_path = os.path.join(directory, filename)
+                if os.path.isfile(file_path):
+                    return file_path
+        raise ToolLoadError(f"Unable to find tool module {filename} in search path: {', '.join(self.search_path)}")
+
+    def _tool_spec(self, file_path):
+        stat = os.stat(file_path)
+        entry = self._manifest.get(file_path)
+        if entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['spec']
+
+        spec = extract_tool_spec(file_path)
+        if spec is None:
+            # metadata is computed at import time so the module has to be executed to read it
+            module = import_tool_module(file_path)
+            spec = dict(
+                tool_name=getattr(module, 'tool_name', None),
+                tool_definition=getattr(module, 'tool_definition', None),
+                tool_prompt_addendum=getattr(module, 'tool_prompt_addendum', ""),
+                tool_cache_ttl=getattr(module, 'tool_cache_ttl', None)
+            )
+
+        validate_tool_spec(file_path, spec)
+        self._manifest[file_path] = dict(mtime_ns=stat.st_mtime_ns, size=stat.st_size, spec=spec)
+        self._manifest_dirty = True
+        return spec
+
+    def load(self, filename):
+        file_path = self.resolve(filename.strip())
+        spec = self._tool_spec(file_path)
+        if spec['tool_name'] in self.tools and self.tools[spec['tool_name']].file_path != file_path:
+            raise ToolLoadError(f"Tool {spec['tool_name']} is defined by both {self.tools[spec['tool_name']].file_path} and {file_path}")
+        tool = self.tools.setdefault(spec['tool_name'], Tool(file_path, spec, self.context))
+        return tool
+
+    def close(self):
+        self.context.close()